@@ -7,17 +7,32 @@ Production FastAPI Backend for MapLibre Runner Tracking System
 """
 
 from fastapi import FastAPI, Query, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 import asyncio
+import bisect
+import hashlib
+import heapq
+import json
 import math
-import requests
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ET
+import numpy as np
+import httpx
 import logging
+from array import array
+from collections import OrderedDict, deque
+from itertools import chain
 from datetime import datetime
+from multiprocessing import shared_memory
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -48,11 +63,29 @@ class RunnerResponse(BaseModel):
     updated_at: str
 
 
+class RunnerCluster(BaseModel):
+    """Group of nearby runners drawn as one map marker"""
+    cluster_id: int
+    lat: float
+    lon: float
+    count: int
+
+
+class RunnerViewportResponse(BaseModel):
+    """API response for runners in a map viewport"""
+    zoom: int
+    version: int
+    runners: List[RunnerResponse]
+    clusters: List[RunnerCluster]
+
+
 class RouteInfo(BaseModel):
     """Route information from OSRM"""
     distance_km: float
     duration_min: float
-    geometry: dict
+    geometry: Optional[dict] = None  # GeoJSON LineString (format=geojson)
+    polyline: Optional[str] = None  # encoded polyline (format=polyline / polyline6)
+    estimated: bool = False  # straight-line estimate while routing is unavailable
 
 
 class RouteResponse(BaseModel):
@@ -65,9 +98,54 @@ class RouteResponse(BaseModel):
 class NearestRunnerResponse(BaseModel):
     """API response for nearest runner"""
     runner: RunnerResponse
+    distance_km: float  # straight-line distance
+    driving_distance_km: Optional[float] = None  # when ranked by driving time
+    duration_min: Optional[float] = None  # driving time, when ranked by driving time
+
+
+class UserPoint(BaseModel):
+    """A user location for batch queries"""
+    lat: float
+    lng: float
+
+
+class NearestRunnersBatchRequest(BaseModel):
+    """Request for nearest runners to many user points"""
+    points: List[UserPoint]
+
+
+class NearestRunnerMatch(BaseModel):
+    """Nearest runner for one user point"""
+    lat: float
+    lng: float
+    runner_id: Optional[int] = None
+    runner_name: Optional[str] = None
+    runner_lat: Optional[float] = None
+    runner_lon: Optional[float] = None
+    distance_km: Optional[float] = None
+
+
+class NearestRunnersBatchResponse(BaseModel):
+    """API response for batch nearest-runner queries"""
+    results: List[NearestRunnerMatch]
+
+
+class NearbyRunner(BaseModel):
+    """Runner with its distance from a query point"""
+    id: int
+    name: str
+    lat: float
+    lon: float
+    status: str
     distance_km: float
 
 
+class NearbyRunnersResponse(BaseModel):
+    """API response for k-nearest / radius runner queries"""
+    count: int
+    runners: List[NearbyRunner]
+
+
 class CoordinateLog(BaseModel):
     """Coordinate click log"""
     latitude: float
@@ -96,6 +174,18 @@ class UserLocation(BaseModel):
     updated_at: str
 
 
+class PositionIngestResponse(BaseModel):
+    """Result of a bulk position ingest"""
+    success: bool
+    received: int
+    accepted: int
+    unknown: int
+    invalid: int
+    stale: int
+    elapsed_ms: float
+    fixes_per_second: float
+
+
 # ==================== DELIVERY ORDER MODELS ====================
 
 class OrderCreateRequest(BaseModel):
@@ -104,6 +194,15 @@ class OrderCreateRequest(BaseModel):
     user_lng: float
 
 
+class OrderEta(BaseModel):
+    """Live progress of a runner along an order's route"""
+    remaining_km: float
+    eta_min: float
+    progress: float  # fraction of the route covered
+    off_route: bool = False
+    updated_time: str
+
+
 class OrderResponse(BaseModel):
     """Delivery order response"""
     order_id: str
@@ -114,19 +213,40 @@ class OrderResponse(BaseModel):
     nearest_runner_name: Optional[str] = None
     nearest_runner_lat: Optional[float] = None
     nearest_runner_lng: Optional[float] = None
-    distance_km: Optional[float] = None
+    distance_km: Optional[float] = None  # straight-line distance to the runner
+    driving_distance_km: Optional[float] = None
+    duration_min: Optional[float] = None
+    route: Optional[RouteInfo] = None  # runner -> customer route, attached after approval
+    eta: Optional[OrderEta] = None  # live ETA while the runner follows the route
     created_time: str
     updated_time: str
+    version: int = 0
+
+
+class OrderPageResponse(BaseModel):
+    """One page of orders in creation order"""
+    orders: List[OrderResponse]
+    next_cursor: Optional[int] = None
+
+
+class OrderChangesResponse(BaseModel):
+    """Orders created or changed since a change cursor"""
+    cursor: int
+    reset: bool = False
+    orders: List[OrderResponse]
 
 
 # ==================== UTILITY FUNCTIONS ====================
 
+EARTH_RADIUS_KM = 6371
+
+
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Calculate distance between two coordinates using Haversine formula.
     Returns distance in kilometers.
     """
-    R = 6371  # Earth radius in km
+    R = EARTH_RADIUS_KM
     
     lat1_rad = math.radians(lat1)
     lat2_rad = math.radians(lat2)
@@ -139,27 +259,436 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     return R * c
 
 
-def call_osrm_route(start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Optional[dict]:
+def haversine_distances(lat, lon, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Vectorized Haversine formula from point(s) to arrays of coordinates.
+    Inputs broadcast like NumPy arrays; returns distances in kilometers.
+    """
+    lat1_rad = np.radians(lat)
+    lat2_rad = np.radians(lats)
+    delta_lat = lat2_rad - lat1_rad
+    delta_lon = np.radians(np.subtract(lons, lon))
+    
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(delta_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# Binary position fix record: int32 runner id, float64 lat, lon, unix timestamp (28 bytes)
+POSITION_FIX_DTYPE = np.dtype([("runner_id", "<i4"), ("lat", "<f8"), ("lon", "<f8"), ("timestamp", "<f8")])
+
+
+def parse_position_fixes(body: bytes, content_type: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
     """
-    Call OSRM API to get route between two points.
-    Uses public OSRM instance - no local setup needed.
-    Returns route data or None if failed.
+    Decode a batch of GPS fixes into (ids, lats, lons, timestamps) arrays.
+    Accepts packed POSITION_FIX_DTYPE records (application/octet-stream) or
+    JSON {"fixes": [[runner_id, lat, lon, timestamp], ...]}.
+    Raises ValueError on malformed input.
     """
+    if content_type.startswith("application/octet-stream"):
+        if len(body) % POSITION_FIX_DTYPE.itemsize:
+            raise ValueError(f"Body length is not a multiple of {POSITION_FIX_DTYPE.itemsize} bytes")
+        records = np.frombuffer(body, dtype=POSITION_FIX_DTYPE)
+        return (records["runner_id"].astype(np.int64), records["lat"].astype(np.float64),
+                records["lon"].astype(np.float64), records["timestamp"].astype(np.float64))
+    
     try:
-        # Use public OSRM API (router.project-osrm.org)
+        fixes = np.asarray(json.loads(body)["fixes"])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Expected {{\"fixes\": [[runner_id, lat, lon, timestamp], ...]}}: {e}")
+    if fixes.size == 0:
+        fixes = np.empty((0, 4))
+    elif fixes.ndim != 2 or fixes.shape[1] != 4:
+        raise ValueError("Each fix must be [runner_id, lat, lon, timestamp]")
+    elif fixes.dtype.kind not in "iuf":
+        raise ValueError("Fix values must be JSON numbers")
+    ids = fixes[:, 0]
+    if fixes.dtype.kind == "f":
+        bad = ~np.isfinite(ids) | (ids != np.floor(ids)) | (np.abs(ids) > 2 ** 53)
+        if bad.any():
+            raise ValueError(f"Runner id must be an integer, got {ids[bad][0]!r}")
+    fixes = fixes.astype(np.float64)
+    return ids.astype(np.int64), fixes[:, 1], fixes[:, 2], fixes[:, 3]
+
+
+def valid_fixes(lats: np.ndarray, lons: np.ndarray, timestamps: np.ndarray) -> np.ndarray:
+    """Mask of fixes with finite, in-range coordinates and a finite timestamp"""
+    return (np.isfinite(lats) & np.isfinite(lons) & np.isfinite(timestamps)
+            & (np.abs(lats) <= 90) & (np.abs(lons) <= 180))
+
+
+def unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Convert coordinates to an (n, 3) array of unit vectors on the sphere"""
+    lat_rad = np.radians(lats)
+    lon_rad = np.radians(lons)
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)))
+
+
+def nearest_rows(point_lats: np.ndarray, point_lons: np.ndarray,
+                 lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Index of the nearest coordinate for each point, and its distance in km.
+    Great-circle distance is monotonic in the dot product of unit vectors,
+    so the points x coordinates problem is one chunked matrix product
+    followed by an exact Haversine distance for each winner. Pure function
+    of its arguments, so it can run in a worker thread.
+    """
+    target_xyz = unit_vectors(lats, lons)
+    point_xyz = unit_vectors(point_lats, point_lons)
+    rows = np.empty(len(point_lats), dtype=np.int64)
+    chunk = max(1, 4_000_000 // max(1, len(lats)))  # ~32 MB of float64 per similarity block
+    for start in range(0, len(point_lats), chunk):
+        rows[start:start + chunk] = np.argmax(point_xyz[start:start + chunk] @ target_xyz.T, axis=1)
+    return rows, haversine_distances(point_lats, point_lons, lats[rows], lons[rows])
+
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """
+    Parse a "west,south,east,north" bounding box (Leaflet toBBoxString order).
+    Raises ValueError on malformed or out-of-range values.
+    """
+    parts = [float(v) for v in bbox.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be west,south,east,north")
+    west, south, east, north = parts
+    if not (-90 <= south <= north <= 90) or not (-180 <= west <= 180) or not (-180 <= east <= 180):
+        raise ValueError("bbox out of range")
+    return west, south, east, north
+
+
+def bbox_mask(lats: np.ndarray, lons: np.ndarray, bbox: Optional[Tuple[float, float, float, float]]) -> np.ndarray:
+    """Boolean mask of coordinates inside a bounding box (west > east crosses the antimeridian)"""
+    if bbox is None:
+        return np.ones(len(lats), dtype=bool)
+    west, south, east, north = bbox
+    in_lat = (lats >= south) & (lats <= north)
+    if west <= east:
+        return in_lat & (lons >= west) & (lons <= east)
+    return in_lat & ((lons >= west) | (lons <= east))
+
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 7) -> str:
+    """Geohash of a point (precision 7 is a ~150 m cell)"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    n_bits = 0
+    even = True  # geohash bits alternate, starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            bit = lon >= mid
+            lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            bit = lat >= mid
+            lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+        bits = (bits << 1) | bit
+        n_bits += 1
+        even = not even
+        if n_bits == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits = 0
+            n_bits = 0
+    return "".join(chars)
+
+
+def simplify_line(coords: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """
+    Douglas-Peucker simplification of an (n, 2) array of [lon, lat] points.
+    Points closer than tolerance_m to the simplified line are dropped;
+    the endpoints are always kept.
+    """
+    n = len(coords)
+    if n < 3 or tolerance_m <= 0:
+        return coords
+    # Local equirectangular projection to meters
+    cos_lat = math.cos(math.radians(float(coords[:, 1].mean())))
+    x = coords[:, 0] * (111320.0 * cos_lat)
+    y = coords[:, 1] * 110540.0
+    
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        px, py = x[a + 1:b] - x[a], y[a + 1:b] - y[a]
+        length = math.hypot(dx, dy)
+        dists = np.abs(px * dy - py * dx) / length if length > 0 else np.hypot(px, py)
+        i = int(np.argmax(dists))
+        if dists[i] > tolerance_m:
+            m = a + 1 + i
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return coords[keep]
+
+
+def zoom_tolerance_m(lat: float, zoom: int, pixels: float = 1.0) -> float:
+    """Ground size in meters of `pixels` Web Mercator pixels at a zoom level and latitude"""
+    return pixels * 156543.03392 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def encode_polyline(coords: np.ndarray, precision: int = 5) -> str:
+    """Encoded polyline (Google format, lat/lon order) of an (n, 2) array of [lon, lat] points"""
+    points = np.round(np.asarray(coords, dtype=np.float64)[:, ::-1] * 10 ** precision).astype(np.int64)
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    chars = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return "".join(chars)
+
+
+# ==================== ROUTING CLIENT ====================
+
+# OSRM server and client limits; point OSRM_BASE_URL at a local osrm-routed for development
+OSRM_BASE_URL = os.environ.get("OSRM_BASE_URL", "https://router.project-osrm.org")
+OSRM_MAX_CONCURRENCY = int(os.environ.get("OSRM_MAX_CONCURRENCY", "8"))
+OSRM_TIMEOUT_SECONDS = float(os.environ.get("OSRM_TIMEOUT_SECONDS", "10"))
+OSRM_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("OSRM_CONNECT_TIMEOUT_SECONDS", "3"))
+# Total time one OSRM lookup may take, hedges included
+OSRM_LATENCY_BUDGET_SECONDS = float(os.environ.get("OSRM_LATENCY_BUDGET_SECONDS", "3"))
+# Hedge delay until enough latency samples exist for a p95 (0 disables hedging)
+OSRM_HEDGE_DELAY_SECONDS = float(os.environ.get("OSRM_HEDGE_DELAY_SECONDS", "0.5"))
+OSRM_BREAKER_FAILURES = int(os.environ.get("OSRM_BREAKER_FAILURES", "5"))
+OSRM_BREAKER_RESET_SECONDS = float(os.environ.get("OSRM_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    Opens after failure_threshold failures in a row and rejects calls until
+    reset_timeout passes; then one probe call is let through (half-open),
+    and its outcome closes or re-opens the breaker.
+    """
+    
+    def __init__(self, failure_threshold: int = OSRM_BREAKER_FAILURES, reset_timeout: float = OSRM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+    
+    def allow(self) -> bool:
+        """Whether a call may go ahead now"""
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        # A probe that never reported back (e.g. cancelled) is replaced after reset_timeout
+        since = self.opened_at if self.state == "open" else self.probe_started
+        if now - since >= self.reset_timeout:
+            self.state = "half_open"
+            self.probe_started = now
+            return True
+        self.rejected += 1
+        return False
+    
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+    
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class OSRMClient:
+    """
+    Async OSRM client on one pooled keep-alive HTTP session.
+    At most max_concurrency requests are in flight at once; the rest wait
+    their turn without blocking the event loop.
+    
+    Each lookup has a latency budget. If the first request has not answered
+    after the recent p95 latency, a second (hedged) request is sent and the
+    first answer wins. A circuit breaker fails lookups fast while OSRM keeps
+    failing.
+    """
+    
+    LATENCY_SAMPLES = 200
+    MIN_P95_SAMPLES = 20
+    
+    def __init__(
+        self,
+        base_url: str = OSRM_BASE_URL,
+        max_concurrency: int = OSRM_MAX_CONCURRENCY,
+        timeout: float = OSRM_TIMEOUT_SECONDS,
+        connect_timeout: float = OSRM_CONNECT_TIMEOUT_SECONDS,
+        budget: float = OSRM_LATENCY_BUDGET_SECONDS,
+        hedge_delay: float = OSRM_HEDGE_DELAY_SECONDS
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.budget = budget
+        self.default_hedge_delay = hedge_delay
+        self.breaker = CircuitBreaker()
+        self.latencies: deque = deque(maxlen=self.LATENCY_SAMPLES)  # seconds, successful requests
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.requests_sent = 0
+        self.lookups = 0
+        self.errors = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.budget_exceeded = 0
+        self.unroutable = 0  # answered with an OSRM error code (e.g. NoRoute) or another 4xx
+    
+    def _session(self) -> httpx.AsyncClient:
+        """Create the pooled session on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+    
+    async def close(self):
+        """Close the pooled session"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def latency_p95(self) -> Optional[float]:
+        """95th percentile of recent successful request latencies, in seconds"""
+        if len(self.latencies) < self.MIN_P95_SAMPLES:
+            return None
+        return float(np.percentile(self.latencies, 95))
+    
+    def hedge_delay(self) -> float:
+        """How long to wait on the first request before hedging"""
+        p95 = self.latency_p95()
+        delay = self.default_hedge_delay if p95 is None else p95
+        return min(max(delay, 0.05), self.budget / 2)
+    
+    async def _request(self, client: httpx.AsyncClient, path: str, params: dict) -> dict:
+        """
+        One HTTP attempt; raises on transport errors, 5xx replies and
+        undecodable 2xx bodies. A 4xx is an answer about the request (OSRM
+        sends NoSegment, NoRoute, TooBig, ... that way), not a backend
+        failure: its OSRM body is returned, or {"code": "HTTP <status>"}.
+        """
+        async with self._semaphore:
+            self.requests_sent += 1
+            started = time.perf_counter()
+            response = await client.get(path, params=params)
+        if 400 <= response.status_code < 500:
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            self.latencies.append(time.perf_counter() - started)
+            if isinstance(data, dict) and "code" in data:
+                return data
+            return {"code": f"HTTP {response.status_code}"}
+        response.raise_for_status()
+        data = response.json()
+        self.latencies.append(time.perf_counter() - started)
+        return data
+    
+    async def _get(self, path: str, params: dict) -> Optional[dict]:
+        """
+        GET an OSRM service path within the latency budget, hedging slow requests.
+        Returns the decoded body, or None on failure, timeout, an open breaker
+        or an OSRM error code. Only transport errors, timeouts and 5xx replies
+        count against the breaker.
+        """
+        if not self.breaker.allow():
+            return None
+        client = self._session()
+        self.lookups += 1
+        deadline = time.monotonic() + self.budget
+        first = asyncio.ensure_future(self._request(client, path, params))
+        pending = {first}
+        hedged = self.default_hedge_delay <= 0
+        data = None
+        error: Optional[Exception] = None
+        
+        try:
+            while pending and data is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait = remaining if hedged else min(remaining, self.hedge_delay())
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        data = task.result()
+                    except (httpx.HTTPError, ValueError) as e:
+                        error = e
+                        continue
+                    if task is not first:
+                        self.hedge_wins += 1
+                    break
+                # Hedge once: when the first request is slow, or failed early
+                if data is None and not hedged and deadline > time.monotonic():
+                    hedged = True
+                    self.hedges_sent += 1
+                    pending.add(asyncio.ensure_future(self._request(client, path, params)))
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        if data is None:
+            self.errors += 1
+            self.breaker.record_failure()
+            if error is None:
+                self.budget_exceeded += 1
+                logger.error(f"OSRM API error: no answer within {self.budget}s budget")
+            else:
+                logger.error(f"OSRM API error: {str(error)}")
+            return None
+        
+        self.breaker.record_success()
+        if data.get("code") != "Ok":
+            self.unroutable += 1
+            logger.warning(f"OSRM rejected request: {data.get('code')} {data.get('message', '')}".rstrip())
+            return None
+        return data
+    
+    async def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Optional[dict]:
+        """
+        Get the driving route between two points.
+        Returns route data or None if failed.
+        """
         # OSRM expects: lon,lat format
-        url = f"https://router.project-osrm.org/route/v1/driving/{start_lon},{start_lat};{end_lon},{end_lat}"
+        path = f"/route/v1/driving/{start_lon},{start_lat};{end_lon},{end_lat}"
         params = {
             "overview": "full",
             "geometries": "geojson"
         }
         
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if data.get("code") == "Ok" and data.get("routes"):
+        data = await self._get(path, params)
+        if data and data.get("routes"):
             route = data["routes"][0]
             return {
                 "geometry": route["geometry"],
@@ -167,30 +696,1089 @@ def call_osrm_route(start_lat: float, start_lon: float, end_lat: float, end_lon:
                 "duration_min": route["duration"] / 60
             }
         return None
+    
+    async def table(self, sources: List[Tuple[float, float]], dest_lat: float,
+                    dest_lon: float) -> Optional[List[Tuple[Optional[float], Optional[float]]]]:
+        """
+        Driving time and distance from each (lat, lon) source to one destination,
+        in a single OSRM table request.
+        Returns [(duration_min, distance_km)] in source order (None where
+        unroutable), or None if failed.
+        """
+        coords = ";".join(f"{lon},{lat}" for lat, lon in sources)
+        path = f"/table/v1/driving/{coords};{dest_lon},{dest_lat}"
+        params = {
+            "sources": ";".join(str(i) for i in range(len(sources))),
+            "destinations": str(len(sources)),
+            "annotations": "duration,distance"
+        }
         
-    except requests.exceptions.RequestException as e:
-        logger.error(f"OSRM API error: {str(e)}")
+        data = await self._get(path, params)
+        if not data or "durations" not in data:
+            return None
+        distances = data.get("distances") or [[None]] * len(sources)
+        return [
+            (
+                duration_row[0] / 60 if duration_row[0] is not None else None,
+                distance_row[0] / 1000 if distance_row[0] is not None else None
+            )
+            for duration_row, distance_row in zip(data["durations"], distances)
+        ]
+    
+    def stats(self) -> dict:
+        """Client counters for the health endpoint"""
+        p95 = self.latency_p95()
+        return {
+            "base_url": self.base_url,
+            "max_concurrency": self.max_concurrency,
+            "lookups": self.lookups,
+            "requests_sent": self.requests_sent,
+            "errors": self.errors,
+            "budget_exceeded": self.budget_exceeded,
+            "unroutable": self.unroutable,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": round(self.hedges_sent / self.lookups, 3) if self.lookups else 0.0,
+            "breaker": self.breaker.stats()
+        }
+
+
+# Route cache: coordinates snapped to ROUTE_CACHE_PRECISION decimal places (4 ~ 11 m)
+ROUTE_CACHE_PRECISION = int(os.environ.get("ROUTE_CACHE_PRECISION", "4"))
+ROUTE_CACHE_TTL_SECONDS = float(os.environ.get("ROUTE_CACHE_TTL_SECONDS", "600"))
+ROUTE_CACHE_MAX_ENTRIES = int(os.environ.get("ROUTE_CACHE_MAX_ENTRIES", "10000"))
+ROUTE_CACHE_MAX_BYTES = int(os.environ.get("ROUTE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Separate budget for simplified/encoded route views, keyed by route ETag, zoom and format
+ROUTE_VIEW_CACHE_MAX_BYTES = int(os.environ.get("ROUTE_VIEW_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+class RouteCache:
+    """
+    LRU cache of parsed OSRM routes keyed by quantized start/end coordinates.
+    Entries expire after ttl seconds; the cache is bounded both by entry count
+    and by an estimate of the memory held by route geometries.
+    """
+    
+    ENTRY_OVERHEAD_BYTES = 512
+    BYTES_PER_POINT = 120  # list + two floats per geometry coordinate
+    
+    def __init__(
+        self,
+        precision: int = ROUTE_CACHE_PRECISION,
+        ttl: float = ROUTE_CACHE_TTL_SECONDS,
+        max_entries: int = ROUTE_CACHE_MAX_ENTRIES,
+        max_bytes: int = ROUTE_CACHE_MAX_BYTES
+    ):
+        self.scale = 10 ** precision
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[float, int, dict]]" = OrderedDict()  # key -> (expires, size, route)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def key(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> tuple:
+        """Snap coordinates to the cache grid"""
+        scale = self.scale
+        return (round(start_lat * scale), round(start_lon * scale), round(end_lat * scale), round(end_lon * scale))
+    
+    def _size(self, route: dict) -> int:
+        coords = (route.get("geometry") or {}).get("coordinates", [])
+        return self.ENTRY_OVERHEAD_BYTES + self.BYTES_PER_POINT * len(coords) + len(route.get("polyline", ""))
+    
+    def _discard(self, key: tuple):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+    
+    def get(self, key: tuple) -> Optional[dict]:
+        """Cached route for a key, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._discard(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+    
+    def put(self, key: tuple, route: dict):
+        """Store a route, evicting least recently used entries past the limits"""
+        if key in self._entries:
+            self._discard(key)
+        size = self._size(route)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, size, route)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+    
+    def stats(self) -> dict:
+        """Cache counters for the health endpoint"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one upstream call.
+    The call runs as its own task, so a caller that goes away (e.g. a client
+    disconnect) does not cancel it for the others still waiting.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[Any, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+    
+    async def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        """Await fn() once per key among concurrent callers and share its result"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+    
+    def stats(self) -> dict:
+        """Coalescing counters for the health endpoint"""
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced
+        }
+
+
+def route_etag(route: dict) -> str:
+    """Strong ETag for a route's distance, duration and geometry"""
+    payload = json.dumps(
+        [route["distance_km"], route["duration_min"], route["geometry"]],
+        separators=(",", ":")
+    )
+    return '"' + hashlib.sha1(payload.encode()).hexdigest()[:24] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value covers etag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+# Route geometry simplification tolerance, in screen pixels at the requested zoom
+ROUTE_SIMPLIFY_PIXELS = 1.0
+POLYLINE_PRECISION = {"polyline": 5, "polyline6": 6}
+
+
+def route_view(route: dict, zoom: Optional[int] = None, fmt: str = "geojson") -> dict:
+    """
+    API payload for a route, with the geometry simplified for a map zoom level
+    and/or encoded as a polyline. Simplified and encoded views are kept in
+    route_view_cache, so a route is simplified once per zoom/format while
+    its view stays cached.
+    """
+    view = {
+        "distance_km": round(route["distance_km"], 2),
+        "duration_min": round(route["duration_min"], 1),
+        "estimated": route.get("estimated", False)
+    }
+    if zoom is None and fmt == "geojson":
+        # The route as-is: nothing to compute or cache
+        view["geometry"] = route["geometry"]
+        view["etag"] = route["etag"]
+        return view
+    
+    key = (route["etag"], zoom, fmt)
+    cached = route_view_cache.get(key)
+    if cached is not None:
+        return cached
+    coords = np.asarray(route["geometry"]["coordinates"], dtype=np.float64).reshape(-1, 2)
+    if zoom is not None:
+        tolerance = zoom_tolerance_m(float(coords[:, 1].mean()), zoom, ROUTE_SIMPLIFY_PIXELS)
+        coords = simplify_line(coords, tolerance)
+    if fmt == "geojson":
+        view["geometry"] = {"type": "LineString", "coordinates": coords.tolist()}
+    else:
+        view["polyline"] = encode_polyline(coords, POLYLINE_PRECISION[fmt])
+    # Distinct validator per view of the same route
+    view["etag"] = f'{route["etag"][:-1]}-{zoom}-{fmt}"'
+    route_view_cache.put(key, view)
+    return view
+
+
+osrm_client = OSRMClient()
+route_cache = RouteCache()
+route_view_cache = RouteCache(max_bytes=ROUTE_VIEW_CACHE_MAX_BYTES)
+route_flights = SingleFlight()
+
+
+async def compute_route(start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Optional[dict]:
+    """
+    Route with the engine chosen by ROUTING_ENGINE, falling back to the other
+    one (the local road graph only when one is loaded).
+    Returns route data or None if both failed.
+    """
+    async def local() -> Optional[dict]:
+        if road_graph is None:
+            return None
+        return await asyncio.to_thread(road_graph.route, start_lat, start_lon, end_lat, end_lon)
+    
+    async def remote() -> Optional[dict]:
+        return await osrm_client.route(start_lat, start_lon, end_lat, end_lon)
+    
+    engines = (local, remote) if ROUTING_ENGINE == "local" else (remote, local)
+    for engine in engines:
+        route = await engine()
+        if route is not None:
+            return route
+    return None
+
+
+# Straight-line estimate served when no routing engine answers
+STRAIGHT_LINE_DETOUR_FACTOR = 1.3
+STRAIGHT_LINE_SPEED_KMH = 25
+
+
+def straight_line_route(start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> dict:
+    """Route estimate from the haversine distance, in the same shape as OSRMClient.route"""
+    distance_km = haversine_distance(start_lat, start_lon, end_lat, end_lon) * STRAIGHT_LINE_DETOUR_FACTOR
+    return {
+        "geometry": {"type": "LineString", "coordinates": [[start_lon, start_lat], [end_lon, end_lat]]},
+        "distance_km": distance_km,
+        "duration_min": distance_km / STRAIGHT_LINE_SPEED_KMH * 60,
+        "estimated": True
+    }
+
+
+async def call_osrm_route(start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Optional[dict]:
+    """
+    Call OSRM API to get route between two points (or the local road graph, see compute_route).
+    Routes are served from route_cache when a nearby (quantized) pair was fetched recently,
+    and concurrent requests for the same quantized pair share one OSRM call.
+    When no engine answers, a straight-line estimate (estimated=True) is
+    returned instead; it is not cached.
+    """
+    key = route_cache.key(start_lat, start_lon, end_lat, end_lon)
+    route = route_cache.get(key)
+    if route is not None:
+        return route
+    
+    async def fetch() -> Optional[dict]:
+        fetched = await compute_route(start_lat, start_lon, end_lat, end_lon)
+        if fetched is None:
+            fetched = straight_line_route(start_lat, start_lon, end_lat, end_lon)
+            fetched["etag"] = route_etag(fetched)
+            return fetched
+        fetched["etag"] = route_etag(fetched)
+        route_cache.put(key, fetched)
+        return fetched
+    
+    return await route_flights.do(key, fetch)
+
+
+# ==================== SPATIAL INDEX ====================
+
+# Starting cell size of the runner grid, in degrees (0.01 ~ 1.1 km); the grid halves it while
+# occupied cells average more than SPATIAL_INDEX_TARGET_BUCKET runners, down to the minimum
+SPATIAL_INDEX_CELL_DEG = float(os.environ.get("SPATIAL_INDEX_CELL_DEG", "0.01"))
+SPATIAL_INDEX_MIN_CELL_DEG = float(os.environ.get("SPATIAL_INDEX_MIN_CELL_DEG", "0.002"))
+SPATIAL_INDEX_TARGET_BUCKET = 16
+# Buckets at least this large are scored with one vectorized distance pass
+SPATIAL_INDEX_VECTOR_BUCKET = 64
+
+class LatLonGrid:
+    """
+    Uniform lat/lon cell grid shared by the spatial indexes.
+
+    Queries walk rings of cells outward from the query cell and stop once a
+    lower bound on the distance to any unvisited cell exceeds the current
+    search limit.
+    """
+
+    def __init__(self, cell_deg: float = 0.01):
+        self.n_lon = max(1, round(360 / cell_deg))
+        self.cell_deg = 360 / self.n_lon
+        self.n_lat = math.ceil(180 / self.cell_deg)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Map a coordinate to its (lat, lon) cell index"""
+        i = min(max(int((lat + 90) // self.cell_deg), 0), self.n_lat - 1)
+        j = int((lon + 180) // self.cell_deg) % self.n_lon
+        return i, j
+
+    def _ring_cells(self, ci: int, cj: int, r: int) -> List[Tuple[int, int]]:
+        """Cells at Chebyshev distance exactly r from (ci, cj)"""
+        if r == 0:
+            return [(ci, cj)]
+        cells = []
+        for di in range(-r, r + 1):
+            i = ci + di
+            if i < 0 or i >= self.n_lat:
+                continue
+            if abs(di) == r:
+                cells.extend((i, (cj + dj) % self.n_lon) for dj in range(-r, r + 1))
+            else:
+                cells.append((i, (cj - r) % self.n_lon))
+                cells.append((i, (cj + r) % self.n_lon))
+        if 2 * r + 1 >= self.n_lon:
+            cells = list(dict.fromkeys(cells))  # ring wraps around the antimeridian
+        return cells
+
+    def _ring_of(self, i: int, j: int, ci: int, cj: int) -> int:
+        """Chebyshev ring number of cell (i, j) around (ci, cj)"""
+        dj = abs(j - cj)
+        return max(abs(i - ci), min(dj, self.n_lon - dj))
+
+    def _ring_lower_bound(self, lat: float, lon: float, ci: int, cj: int, r: int) -> float:
+        """Lower bound (km) on the distance to any point in ring r or beyond"""
+        lat_gap = math.inf
+        if ci - r >= 0:
+            lat_gap = lat - ((ci - r + 1) * self.cell_deg - 90)
+        if ci + r < self.n_lat:
+            lat_gap = min(lat_gap, (ci + r) * self.cell_deg - 90 - lat)
+        lat_bound = EARTH_RADIUS_KM * math.radians(lat_gap) if lat_gap != math.inf else math.inf
+
+        lon_bound = math.inf
+        if 2 * r <= self.n_lon:
+            offset = (lon + 180) - cj * self.cell_deg
+            lon_gap = min(r * self.cell_deg - offset, offset + (r - 1) * self.cell_deg)
+            # Cross-track distance from the query point to the nearest bounding meridian
+            lon_gap = min(max(lon_gap, 0.0), 90.0)
+            lon_bound = EARTH_RADIUS_KM * math.asin(
+                min(1.0, math.cos(math.radians(lat)) * math.sin(math.radians(lon_gap)))
+            )
+
+        bound = min(lat_bound, lon_bound)
+        return bound - 1e-9 * (1 + bound)  # absorb floating point rounding
+
+
+class GridSpatialIndex(LatLonGrid):
+    """
+    Grid of point buckets that moves with its points.
+
+    Each point is stored with an `order` value used to break distance ties,
+    so results match a linear scan over the points in that order. The grid
+    refines itself (halving the cell size, down to min_cell_deg) as points
+    get denser, so buckets stay small for large city fleets.
+    """
+
+    def __init__(self, cell_deg: float = SPATIAL_INDEX_CELL_DEG, min_cell_deg: float = SPATIAL_INDEX_MIN_CELL_DEG):
+        super().__init__(cell_deg)
+        self.min_cell_deg = min(min_cell_deg, self.cell_deg)
+        self.cells: Dict[Tuple[int, int], set] = {}
+        self.points: Dict[Any, Tuple[float, float, int]] = {}  # key -> (lat, lon, order)
+        self._key_cells: Dict[Any, Tuple[int, int]] = {}
+        # (min i, max i, min j, max j) covering every occupied cell; may be loose after removals
+        self._bounds: Optional[List[int]] = None
+        self.refinements = 0
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _maybe_refine(self):
+        """Halve the cell size while occupied cells hold too many points on average"""
+        while (len(self.points) > SPATIAL_INDEX_TARGET_BUCKET * len(self.cells)
+               and self.cell_deg / 2 >= self.min_cell_deg):
+            LatLonGrid.__init__(self, self.cell_deg / 2)
+            self.cells = {}
+            self._bounds = None
+            for key, (lat, lon, _) in self.points.items():
+                cell = self._cell(lat, lon)
+                self.cells.setdefault(cell, set()).add(key)
+                self._key_cells[key] = cell
+                self._extend_bounds(cell)
+            self.refinements += 1
+
+    def _extend_bounds(self, cell: Tuple[int, int]):
+        i, j = cell
+        if self._bounds is None:
+            self._bounds = [i, i, j, j]
+            return
+        bounds = self._bounds
+        bounds[0] = min(bounds[0], i)
+        bounds[1] = max(bounds[1], i)
+        bounds[2] = min(bounds[2], j)
+        bounds[3] = max(bounds[3], j)
+
+    def _first_ring(self, ci: int, cj: int) -> int:
+        """Smallest ring around (ci, cj) that can hold an occupied cell"""
+        if self._bounds is None:
+            return 0
+        i_min, i_max, j_min, j_max = self._bounds
+        di = max(i_min - ci, ci - i_max, 0)
+        dj = 0 if j_min <= cj <= j_max else min((j_min - cj) % self.n_lon, (cj - j_max) % self.n_lon)
+        return max(di, dj)
+
+    def insert(self, key: Any, lat: float, lon: float, order: int):
+        """Add a point, replacing any existing point with the same key"""
+        if key in self.points:
+            self.remove(key)
+        cell = self._cell(lat, lon)
+        self.cells.setdefault(cell, set()).add(key)
+        self.points[key] = (lat, lon, order)
+        self._key_cells[key] = cell
+        self._extend_bounds(cell)
+        self._maybe_refine()
+
+    def move(self, key: Any, lat: float, lon: float):
+        """Update a point's position, re-bucketing only when it changes cell"""
+        _, _, order = self.points[key]
+        self.points[key] = (lat, lon, order)
+        cell = self._cell(lat, lon)
+        old_cell = self._key_cells[key]
+        if cell != old_cell:
+            bucket = self.cells[old_cell]
+            bucket.discard(key)
+            self.cells.setdefault(cell, set()).add(key)
+            self._key_cells[key] = cell
+            self._extend_bounds(cell)
+            if not bucket:
+                del self.cells[old_cell]
+                self._maybe_refine()
+
+    def remove(self, key: Any):
+        """Remove a point if present"""
+        if key not in self.points:
+            return
+        del self.points[key]
+        cell = self._key_cells.pop(key)
+        bucket = self.cells[cell]
+        bucket.discard(key)
+        if not bucket:
+            del self.cells[cell]
+
+    def nearest(self, lat: float, lon: float) -> Tuple[Any, Optional[float]]:
+        """
+        Find the closest point by haversine distance.
+        Returns (key, distance_km), or (None, None) when the index is empty.
+        """
+        found = self.search(lat, lon, k=1)
+        return found[0] if found else (None, None)
+
+    def search(self, lat: float, lon: float, k: Optional[int] = None, radius_km: Optional[float] = None,
+               predicate: Optional[Callable[[Any], bool]] = None) -> List[Tuple[Any, float]]:
+        """
+        Find the k closest points and/or all points within radius_km,
+        optionally restricted to keys accepted by predicate.
+        Returns [(key, distance_km), ...] sorted by distance.
+        """
+        if not self.points or (k is not None and k <= 0):
+            return []
+
+        ci, cj = self._cell(lat, lon)
+        # Max-heap of the best matches so far as (-distance, -order, key)
+        best: List[Tuple[float, int, Any]] = []
+        seen = 0
+
+        def limit() -> float:
+            bound = radius_km if radius_km is not None else math.inf
+            if k is not None and len(best) == k:
+                bound = min(bound, -best[0][0])
+            return bound
+
+        def candidates(bucket):
+            """
+            (key, order, distance) for a bucket's points. Big buckets are first
+            narrowed with one vectorized pass (with a little slack for rounding);
+            reported distances always come from haversine_distance.
+            """
+            if len(bucket) < SPATIAL_INDEX_VECTOR_BUCKET:
+                keys = bucket
+            else:
+                keys = list(bucket)
+                points = self.points
+                coords = np.fromiter(chain.from_iterable(points[key] for key in keys), dtype=np.float64,
+                                     count=3 * len(keys)).reshape(-1, 3)
+                dists = haversine_distances(lat, lon, coords[:, 0], coords[:, 1])
+                bound = limit()
+                if k is not None and predicate is None and len(dists) > k:
+                    bound = min(bound, float(np.partition(dists, k - 1)[k - 1]))
+                keys = [keys[idx] for idx in np.flatnonzero(dists <= bound * (1 + 1e-9) + 1e-9).tolist()]
+            for key in keys:
+                p_lat, p_lon, order = self.points[key]
+                yield key, order, haversine_distance(lat, lon, p_lat, p_lon)
+
+        def scan(bucket) -> int:
+            for key, order, dist in candidates(bucket):
+                if radius_km is not None and dist > radius_km:
+                    continue
+                if predicate is not None and not predicate(key):
+                    continue
+                if k is None or len(best) < k:
+                    heapq.heappush(best, (-dist, -order, key))
+                elif (dist, order) < (-best[0][0], -best[0][1]):
+                    heapq.heapreplace(best, (-dist, -order, key))
+            return len(bucket)
+
+        r = self._first_ring(ci, cj)
+        walked = 0
+        while True:
+            if r > 0 and max(8 * r, walked) > len(self.cells):
+                # Sparse grid: scoring the remaining buckets at once is cheaper than walking empty rings
+                remaining = [bucket for (i, j), bucket in self.cells.items() if self._ring_of(i, j, ci, cj) >= r]
+                if remaining:
+                    scan(set().union(*remaining))
+                break
+            ring = self._ring_cells(ci, cj, r)
+            walked += len(ring)
+            for cell in ring:
+                bucket = self.cells.get(cell)
+                if bucket:
+                    seen += scan(bucket)
+            if seen >= len(self.points) or self._ring_lower_bound(lat, lon, ci, cj, r + 1) > limit():
+                break
+            r += 1
+
+        return [(key, -neg_dist) for neg_dist, _, key in sorted(best, reverse=True)]
+
+
+class ColumnarGridIndex(LatLonGrid):
+    """
+    Grid index over coordinate columns.
+
+    Rather than moving points between buckets on every update, the index is
+    rebuilt with one vectorized sort of cell codes; each cell's rows are then
+    a contiguous slice found by binary search.
+    """
+
+    def __init__(self, cell_deg: float = 0.01):
+        super().__init__(cell_deg)
+        self.rows = np.empty(0, dtype=np.int64)   # row numbers sorted by cell code
+        self.codes = np.empty(0, dtype=np.int64)  # sorted cell codes
+        self.occupied_cells = 0
+        self.version = None
+
+    def rebuild(self, lats: np.ndarray, lons: np.ndarray, version: Any = None):
+        """Re-bucket all rows from their current coordinates"""
+        i = np.clip(((lats + 90) // self.cell_deg).astype(np.int64), 0, self.n_lat - 1)
+        j = ((lons + 180) // self.cell_deg).astype(np.int64) % self.n_lon
+        codes = i * self.n_lon + j
+        self.rows = np.argsort(codes, kind="stable")
+        self.codes = codes[self.rows]
+        self.occupied_cells = int(np.count_nonzero(np.diff(self.codes))) + 1 if len(codes) else 0
+        self.version = version
+
+    def _rows_in_cells(self, cells: List[Tuple[int, int]]) -> np.ndarray:
+        """Rows bucketed in any of the given cells"""
+        codes = np.fromiter((i * self.n_lon + j for i, j in cells), dtype=np.int64, count=len(cells))
+        starts = np.searchsorted(self.codes, codes, side="left")
+        ends = np.searchsorted(self.codes, codes, side="right")
+        hits = ends > starts
+        if not hits.any():
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.rows[s:e] for s, e in zip(starts[hits].tolist(), ends[hits].tolist())])
+
+    def _rows_beyond_ring(self, ci: int, cj: int, r: int) -> np.ndarray:
+        """Rows whose cell is at ring r or further from (ci, cj)"""
+        i = self.codes // self.n_lon
+        dj = np.abs(self.codes % self.n_lon - cj)
+        rings = np.maximum(np.abs(i - ci), np.minimum(dj, self.n_lon - dj))
+        return self.rows[rings >= r]
+
+    def search(self, lat: float, lon: float, lats: np.ndarray, lons: np.ndarray,
+               k: Optional[int] = None, radius_km: Optional[float] = None,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k closest rows and/or all rows within radius_km, optionally
+        restricted to rows where mask is True. Distance ties go to the lower row.
+        Returns (rows, distances_km) sorted by distance.
+        """
+        if len(self.rows) == 0 or (k is not None and k <= 0):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        ci, cj = self._cell(lat, lon)
+        found_rows: List[np.ndarray] = []
+        found_dists: List[np.ndarray] = []
+        found = 0
+        seen = 0
+
+        def take(rows: np.ndarray):
+            nonlocal found
+            dists = haversine_distances(lat, lon, lats[rows], lons[rows])
+            keep = np.ones(len(rows), dtype=bool)
+            if radius_km is not None:
+                keep &= dists <= radius_km
+            if mask is not None:
+                keep &= mask[rows]
+            found_rows.append(rows[keep])
+            found_dists.append(dists[keep])
+            found += int(keep.sum())
+
+        def limit() -> float:
+            bound = radius_km if radius_km is not None else math.inf
+            if k is not None and found >= k:
+                bound = min(bound, float(np.partition(np.concatenate(found_dists), k - 1)[k - 1]))
+            return bound
+
+        r = 0
+        while True:
+            if r > 0 and 8 * r > self.occupied_cells:
+                # Sparse grid: filter the remaining rows in one pass
+                take(self._rows_beyond_ring(ci, cj, r))
+                break
+            rows = self._rows_in_cells(self._ring_cells(ci, cj, r))
+            if len(rows):
+                take(rows)
+                seen += len(rows)
+            if seen >= len(self.rows) or self._ring_lower_bound(lat, lon, ci, cj, r + 1) > limit():
+                break
+            r += 1
+
+        rows = np.concatenate(found_rows) if found_rows else np.empty(0, dtype=np.int64)
+        dists = np.concatenate(found_dists) if found_dists else np.empty(0)
+        order = np.lexsort((rows, dists))[:k]
+        return rows[order], dists[order]
+
+
+# ==================== OFFLINE ROUTING ENGINE ====================
+
+# Local road graph: an OSM XML extract (.osm) or a graph saved with RoadGraph.save (.npz)
+ROUTING_GRAPH_PATH = os.environ.get("ROUTING_GRAPH_PATH", "")
+# "osrm" (local graph as fallback) or "local" (OSRM as fallback)
+ROUTING_ENGINE = os.environ.get("ROUTING_ENGINE", "osrm")
+ROUTING_MAX_SNAP_KM = float(os.environ.get("ROUTING_MAX_SNAP_KM", "1.0"))
+
+# Assumed speeds per OSM highway type; ways of other types are not drivable
+ROAD_SPEEDS_KMH = {
+    "motorway": 100, "motorway_link": 60,
+    "trunk": 80, "trunk_link": 50,
+    "primary": 60, "primary_link": 40,
+    "secondary": 50, "secondary_link": 35,
+    "tertiary": 40, "tertiary_link": 30,
+    "unclassified": 30, "residential": 25,
+    "living_street": 10, "service": 15, "road": 25
+}
+
+
+def parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    """OSM maxspeed tag in km/h, or None if missing or not numeric"""
+    if not value:
         return None
+    parts = value.split()
+    try:
+        speed = float(parts[0])
+    except ValueError:
+        return None
+    if len(parts) > 1 and parts[1] == "mph":
+        speed *= 1.609344
+    return speed if speed > 0 else None
+
+
+class RoadGraph:
+    """
+    Drivable road network in CSR (compressed sparse row) arrays.
+    
+    Edges carry travel seconds and meters. Forward (out_*) and reverse (in_*)
+    adjacency are both kept so shortest paths can run as a bidirectional A*
+    with average potentials, using a straight-line travel-time lower bound
+    at the graph's top speed.
+    """
+    
+    def __init__(self, node_lats: np.ndarray, node_lons: np.ndarray, src: np.ndarray,
+                 dst: np.ndarray, seconds: np.ndarray, meters: np.ndarray):
+        self.node_lats = np.asarray(node_lats, dtype=np.float64)
+        self.node_lons = np.asarray(node_lons, dtype=np.float64)
+        self.src = np.asarray(src, dtype=np.int32)
+        self.dst = np.asarray(dst, dtype=np.int32)
+        self.seconds = np.asarray(seconds, dtype=np.float64)
+        self.meters = np.asarray(meters, dtype=np.float64)
+        n = len(self.node_lats)
+        
+        self.out_indptr, self.out_indices, self.out_seconds, self.out_meters = self._csr(self.src, self.dst, n)
+        self.in_indptr, self.in_indices, self.in_seconds, _ = self._csr(self.dst, self.src, n)
+        
+        # Seconds per km at the fastest edge: keeps the A* bound admissible
+        fastest_kmh = float(np.max(self.meters / self.seconds) * 3.6) if len(self.seconds) else 1.0
+        self.seconds_per_km = 3600 / fastest_kmh
+        
+        self.index = ColumnarGridIndex()
+        self.index.rebuild(self.node_lats, self.node_lons)
+        self.queries = 0
+        self.failures = 0
+        self.total_ms = 0.0
+    
+    def _csr(self, tails: np.ndarray, heads: np.ndarray, n: int) -> tuple:
+        order = np.argsort(tails, kind="stable")
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=n), out=indptr[1:])
+        return indptr, heads[order], self.seconds[order], self.meters[order]
+    
+    @classmethod
+    def from_osm_xml(cls, path: str) -> "RoadGraph":
+        """Build the graph from the drivable highways of an OSM XML extract"""
+        coords: Dict[int, Tuple[float, float]] = {}
+        node_index: Dict[int, int] = {}
+        lats: List[float] = []
+        lons: List[float] = []
+        src: List[int] = []
+        dst: List[int] = []
+        seconds: List[float] = []
+        meters: List[float] = []
+        
+        def index_of(osm_id: int) -> int:
+            idx = node_index.get(osm_id)
+            if idx is None:
+                idx = node_index[osm_id] = len(lats)
+                lat, lon = coords[osm_id]
+                lats.append(lat)
+                lons.append(lon)
+            return idx
+        
+        for _, elem in ET.iterparse(path, events=("end",)):
+            if elem.tag == "node":
+                coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+            elif elem.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                highway = tags.get("highway")
+                if highway in ROAD_SPEEDS_KMH and tags.get("access") not in ("no", "private"):
+                    refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                    refs = [ref for ref in refs if ref in coords]
+                    speed = parse_maxspeed(tags.get("maxspeed")) or ROAD_SPEEDS_KMH[highway]
+                    oneway = tags.get("oneway")
+                    forward = oneway != "-1"
+                    backward = oneway == "-1" or not (oneway in ("yes", "true", "1")
+                                                      or tags.get("junction") == "roundabout"
+                                                      or (highway == "motorway" and oneway != "no"))
+                    for a, b in zip(refs, refs[1:]):
+                        u, v = index_of(a), index_of(b)
+                        length = haversine_distance(lats[u], lons[u], lats[v], lons[v]) * 1000
+                        travel = max(length / (speed / 3.6), 1e-3)
+                        if forward:
+                            src.append(u); dst.append(v); seconds.append(travel); meters.append(length)
+                        if backward:
+                            src.append(v); dst.append(u); seconds.append(travel); meters.append(length)
+            if elem.tag in ("node", "way", "relation"):
+                elem.clear()
+        
+        return cls(np.array(lats), np.array(lons), np.array(src, dtype=np.int32),
+                   np.array(dst, dtype=np.int32), np.array(seconds), np.array(meters))
+    
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        """Load a graph from a .npz saved by save(), or parse an OSM XML extract"""
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                return cls(data["node_lats"], data["node_lons"], data["src"], data["dst"],
+                           data["seconds"], data["meters"])
+        return cls.from_osm_xml(path)
+    
+    def save(self, path: str):
+        """Save the graph arrays so later startups skip XML parsing"""
+        np.savez_compressed(path, node_lats=self.node_lats, node_lons=self.node_lons, src=self.src,
+                            dst=self.dst, seconds=self.seconds, meters=self.meters)
+    
+    def snap(self, lat: float, lon: float) -> Optional[int]:
+        """Nearest graph node within ROUTING_MAX_SNAP_KM, or None"""
+        rows, _ = self.index.search(lat, lon, self.node_lats, self.node_lons, k=1, radius_km=ROUTING_MAX_SNAP_KM)
+        return int(rows[0]) if len(rows) else None
+    
+    def shortest_path(self, source: int, target: int) -> Optional[List[int]]:
+        """Fastest node path from source to target, or None if unreachable"""
+        if source == target:
+            return [source]
+        lats, lons = self.node_lats, self.node_lons
+        s_lat, s_lon = float(lats[source]), float(lons[source])
+        t_lat, t_lon = float(lats[target]), float(lons[target])
+        half_rate = self.seconds_per_km / 2
+        potentials: Dict[int, float] = {}
+        
+        def potential(v: int) -> float:
+            # Average of the forward (to target) and reverse (from source) bounds
+            p = potentials.get(v)
+            if p is None:
+                lat, lon = float(lats[v]), float(lons[v])
+                p = (haversine_distance(lat, lon, t_lat, t_lon) - haversine_distance(lat, lon, s_lat, s_lon)) * half_rate
+                potentials[v] = p
+            return p
+        
+        graphs = (
+            (self.out_indptr, self.out_indices, self.out_seconds, 1.0),
+            (self.in_indptr, self.in_indices, self.in_seconds, -1.0)
+        )
+        dist = ({source: 0.0}, {target: 0.0})
+        parent = ({source: -1}, {target: -1})
+        settled = (set(), set())
+        heaps = ([(potential(source), source)], [(-potential(target), target)])
+        best = math.inf
+        meet = -1
+        
+        while heaps[0] and heaps[1]:
+            # With average potentials, the searches can stop once their keys meet the best path
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            _, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            
+            indptr, indices, weights, sign = graphs[side]
+            own, other = dist[side], dist[1 - side]
+            du = own[u]
+            a, b = indptr[u], indptr[u + 1]
+            for v, w in zip(indices[a:b].tolist(), weights[a:b].tolist()):
+                dv = du + w
+                if dv < own.get(v, math.inf):
+                    own[v] = dv
+                    parent[side][v] = u
+                    heapq.heappush(heaps[side], (dv + sign * potential(v), v))
+                    if v in other and dv + other[v] < best:
+                        best = dv + other[v]
+                        meet = v
+        
+        if meet < 0:
+            return None
+        path = []
+        v = meet
+        while v != -1:
+            path.append(v)
+            v = parent[0][v]
+        path.reverse()
+        v = parent[1][meet]
+        while v != -1:
+            path.append(v)
+            v = parent[1][v]
+        return path
+    
+    def _edge(self, u: int, v: int) -> Tuple[float, float]:
+        """(seconds, meters) of the fastest u -> v edge"""
+        a, b = self.out_indptr[u], self.out_indptr[u + 1]
+        hits = np.flatnonzero(self.out_indices[a:b] == v) + a
+        i = hits[np.argmin(self.out_seconds[hits])]
+        return float(self.out_seconds[i]), float(self.out_meters[i])
+    
+    def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Optional[dict]:
+        """
+        Fastest route between two points, in the same shape as OSRMClient.route.
+        Returns route data or None if a point is off the graph or unreachable.
+        """
+        started = time.perf_counter()
+        self.queries += 1
+        source, target = self.snap(start_lat, start_lon), self.snap(end_lat, end_lon)
+        path = self.shortest_path(source, target) if source is not None and target is not None else None
+        self.total_ms += (time.perf_counter() - started) * 1000
+        if path is None:
+            self.failures += 1
+            return None
+        
+        seconds = 0.0
+        meters = 0.0
+        for u, v in zip(path, path[1:]):
+            edge_seconds, edge_meters = self._edge(u, v)
+            seconds += edge_seconds
+            meters += edge_meters
+        coordinates = np.column_stack((self.node_lons[path], self.node_lats[path])).tolist()
+        if len(coordinates) == 1:
+            coordinates.append(coordinates[0])
+        return {
+            "geometry": {"type": "LineString", "coordinates": coordinates},
+            "distance_km": meters / 1000,
+            "duration_min": seconds / 60
+        }
+    
+    def stats(self) -> dict:
+        """Graph size and query counters for the health endpoint"""
+        return {
+            "nodes": len(self.node_lats),
+            "edges": len(self.src),
+            "queries": self.queries,
+            "failures": self.failures,
+            "avg_query_ms": round(self.total_ms / self.queries, 2) if self.queries else 0.0
+        }
+
+
+road_graph: Optional[RoadGraph] = None  # set at startup when ROUTING_GRAPH_PATH is configured
 
 
 # ==================== IN-MEMORY DATA STORE ====================
 
+# Position history kept per runner, and how many recent points API responses include
+RUNNER_HISTORY_CAPACITY = int(os.environ.get("RUNNER_HISTORY_CAPACITY", "100"))
+RUNNER_HISTORY_POINTS = int(os.environ.get("RUNNER_HISTORY_POINTS", "50"))
+
+
+class PositionHistory:
+    """
+    Fixed-capacity circular buffer of [lat, lon] points.
+    Backed by a preallocated float array; appends overwrite the oldest point.
+    """
+    
+    __slots__ = ("capacity", "buffer", "head", "size")
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffer = array("d", bytes(16 * capacity))  # interleaved lat, lon
+        self.head = 0  # next slot to write
+        self.size = 0
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def append(self, lat: float, lon: float):
+        """Record a point in O(1) without allocating"""
+        i = 2 * self.head
+        self.buffer[i] = lat
+        self.buffer[i + 1] = lon
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+    
+    def last(self, k: int) -> List[List[float]]:
+        """Get the most recent k points, oldest first, copying only those points"""
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        start = (self.head - k) % self.capacity
+        end = start + k
+        if end <= self.capacity:
+            flat = self.buffer[2 * start:2 * end]
+        else:
+            flat = self.buffer[2 * start:] + self.buffer[:2 * (end - self.capacity)]
+        return [[flat[i], flat[i + 1]] for i in range(0, 2 * k, 2)]
+
+
+SEED_RUNNERS: List[dict] = [
+    {"id": 1, "name": "Alice", "lat": 13.6288, "lon": 79.4192, "status": "active"},
+    {"id": 2, "name": "Bob", "lat": 13.6350, "lon": 79.4200, "status": "active"},
+    {"id": 3, "name": "Charlie", "lat": 13.6200, "lon": 79.4150, "status": "active"},
+    {"id": 4, "name": "Diana", "lat": 13.6400, "lon": 79.4300, "status": "active"},
+    {"id": 5, "name": "Eve", "lat": 13.6100, "lon": 79.4250, "status": "active"},
+]
+
+
 class RunnerDatabase:
     """In-memory runner database with thread-safe operations"""
     
-    def __init__(self):
-        self.runners: List[dict] = [
-            {"id": 1, "name": "Alice", "lat": 13.6288, "lon": 79.4192, "status": "active", "history": [[13.6288, 79.4192]]},
-            {"id": 2, "name": "Bob", "lat": 13.6350, "lon": 79.4200, "status": "active", "history": [[13.6350, 79.4200]]},
-            {"id": 3, "name": "Charlie", "lat": 13.6200, "lon": 79.4150, "status": "active", "history": [[13.6200, 79.4150]]},
-            {"id": 4, "name": "Diana", "lat": 13.6400, "lon": 79.4300, "status": "active", "history": [[13.6400, 79.4300]]},
-            {"id": 5, "name": "Eve", "lat": 13.6100, "lon": 79.4250, "status": "active", "history": [[13.6100, 79.4250]]},
-        ]
+    backend = "dict"
+    
+    def __init__(self, history_capacity: int = RUNNER_HISTORY_CAPACITY, history_points: int = RUNNER_HISTORY_POINTS):
+        self.history_capacity = max(1, history_capacity)
+        self.history_points = min(history_points, self.history_capacity)
+        self.position_listeners: List[Callable[[np.ndarray, np.ndarray, np.ndarray], None]] = []
+        self._load_runners(SEED_RUNNERS)
         # Track user selected locations and saved favorites
         self.user_selected_location = {"lat": 13.6288, "lon": 79.4192, "updated_at": datetime.now().isoformat()}
         self.user_saved_locations: List[dict] = []
         self.clicked_coordinates: List[dict] = []  # Log all map clicks
     
+    def _load_runners(self, seeds: List[dict]):
+        """Initialize runner storage from seed records"""
+        self.runners: List[dict] = []
+        self.runners_by_id: Dict[int, dict] = {}  # runner id -> record in self.runners
+        # Grid index over runner positions for nearest-runner queries
+        self.spatial_index = GridSpatialIndex()
+        self._next_order = 0
+        self.positions_version = 0  # bumped whenever any runner moves, appears or disappears
+        for r in seeds:
+            self.add_runner(r["id"], r["name"], r["lat"], r["lon"], r["status"])
+    
+    def add_runner(self, runner_id: int, name: str, lat: float, lon: float, status: str = "active") -> Optional[dict]:
+        """Add a runner; returns None if the id is already taken"""
+        if runner_id in self.runners_by_id:
+            return None
+        runner = {"id": runner_id, "name": name, "lat": lat, "lon": lon, "status": status,
+                  "history": PositionHistory(self.history_capacity), "fix_ts": -math.inf}
+        runner["history"].append(lat, lon)
+        self.runners.append(runner)
+        self.runners_by_id[runner_id] = runner
+        self.spatial_index.insert(runner_id, lat, lon, self._next_order)
+        self._next_order += 1
+        self.positions_version += 1
+        return self.get_runner(runner_id)
+    
+    def remove_runner(self, runner_id: int) -> bool:
+        """Remove a runner by id"""
+        runner = self.runners_by_id.pop(runner_id, None)
+        if runner is None:
+            return False
+        self.runners.remove(runner)
+        self.spatial_index.remove(runner_id)
+        self.positions_version += 1
+        return True
+    
+    def runner_count(self) -> int:
+        """Number of runners in the store"""
+        return len(self.runners)
+    
+    def get_positions(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get (ids, lats, lons) arrays for all runners"""
+        n = len(self.runners)
+        ids = np.fromiter((r["id"] for r in self.runners), dtype=np.int64, count=n)
+        lats = np.fromiter((r["lat"] for r in self.runners), dtype=np.float64, count=n)
+        lons = np.fromiter((r["lon"] for r in self.runners), dtype=np.float64, count=n)
+        return ids, lats, lons
+    
+    def add_position_listener(self, listener: Callable[[np.ndarray, np.ndarray, np.ndarray], None]):
+        """Register a callback receiving (ids, lats, lons) for every batch of moved runners"""
+        self.position_listeners.append(listener)
+    
+    def _notify_positions(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray):
+        """Pass a batch of moved runners to all listeners"""
+        if len(ids) == 0:
+            return
+        for listener in self.position_listeners:
+            try:
+                listener(ids, lats, lons)
+            except Exception as e:
+                logger.error(f"Position listener error: {str(e)}")
+    
+    def update_positions(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray):
+        """Update positions for many runners at once"""
+        moved = [runner_id in self.runners_by_id for runner_id in ids.tolist()]
+        for runner_id, lat, lon, known in zip(ids.tolist(), lats.tolist(), lons.tolist(), moved):
+            if known:
+                self._move_runner(self.runners_by_id[runner_id], lat, lon)
+        moved = np.array(moved, dtype=bool)
+        self._notify_positions(ids[moved], lats[moved], lons[moved])
+    
+    def ingest_positions(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray,
+                         timestamps: np.ndarray) -> dict:
+        """
+        Apply a batch of GPS fixes in timestamp order.
+        Fixes for unknown runners, with invalid coordinates or timestamps, or
+        older than the runner's last ingested fix are skipped. Returns
+        per-outcome counts.
+        """
+        counts = {"accepted": 0, "unknown": 0, "invalid": 0, "stale": 0}
+        order = np.argsort(timestamps, kind="stable")
+        ids, lats, lons, timestamps = ids[order], lats[order], lons[order], timestamps[order]
+        valid = valid_fixes(lats, lons, timestamps)
+        accepted = np.zeros(len(ids), dtype=bool)
+        for i, (runner_id, lat, lon, ts, ok) in enumerate(zip(ids.tolist(), lats.tolist(), lons.tolist(),
+                                                               timestamps.tolist(), valid.tolist())):
+            runner = self.runners_by_id.get(runner_id)
+            if runner is None:
+                counts["unknown"] += 1
+            elif not ok:
+                counts["invalid"] += 1
+            elif ts < runner["fix_ts"]:
+                counts["stale"] += 1
+            else:
+                runner["fix_ts"] = ts
+                self._move_runner(runner, lat, lon)
+                accepted[i] = True
+                counts["accepted"] += 1
+        self._notify_positions(ids[accepted], lats[accepted], lons[accepted])
+        return counts
+    
     def get_all_runners(self) -> List[dict]:
         """Get all runners with history"""
         return [
@@ -200,7 +1788,7 @@ class RunnerDatabase:
                 "lat": r["lat"],
                 "lon": r["lon"],
                 "status": r["status"],
-                "history": r.get("history", [])[-50:] if r.get("history") else [],
+                "history": r["history"].last(self.history_points),
                 "updated_at": datetime.now().isoformat()
             }
             for r in self.runners
@@ -208,7 +1796,7 @@ class RunnerDatabase:
     
     def get_runner(self, runner_id: int) -> Optional[dict]:
         """Get specific runner"""
-        runner = next((r for r in self.runners if r["id"] == runner_id), None)
+        runner = self.runners_by_id.get(runner_id)
         if runner:
             return {
                 "id": runner["id"],
@@ -216,35 +1804,38 @@ class RunnerDatabase:
                 "lat": runner["lat"],
                 "lon": runner["lon"],
                 "status": runner["status"],
-                "history": runner.get("history", [])[-50:] if runner.get("history") else [],
+                "history": runner["history"].last(self.history_points),
                 "updated_at": datetime.now().isoformat()
             }
         return None
     
+    def get_runners(self, runner_ids: List[int]) -> List[dict]:
+        """Get specific runners, skipping unknown ids"""
+        runners = (self.get_runner(runner_id) for runner_id in runner_ids)
+        return [r for r in runners if r]
+    
     def update_runner_position(self, runner_id: int, lat: float, lon: float):
         """Update runner position and track history"""
-        runner = next((r for r in self.runners if r["id"] == runner_id), None)
+        runner = self.runners_by_id.get(runner_id)
         if runner:
-            runner["lat"] = lat
-            runner["lon"] = lon
-            runner["history"].append([lat, lon])
-            # Keep history to last 100 points to prevent memory bloat
-            if len(runner["history"]) > 100:
-                runner["history"] = runner["history"][-100:]
+            self._move_runner(runner, lat, lon)
+            self._notify_positions(np.array([runner_id]), np.array([lat]), np.array([lon]))
+    
+    def _move_runner(self, runner: dict, lat: float, lon: float):
+        """Move one runner record, keeping the spatial index and history in step"""
+        runner["lat"] = lat
+        runner["lon"] = lon
+        self.spatial_index.move(runner["id"], lat, lon)
+        runner["history"].append(lat, lon)
+        self.positions_version += 1
     
     def find_nearest_runner(self, user_lat: float, user_lon: float) -> tuple:
         """
         Find nearest runner to user location.
         Returns (runner_data, distance_in_km)
         """
-        min_distance = float('inf')
-        nearest_runner = None
-        
-        for runner in self.runners:
-            dist = haversine_distance(user_lat, user_lon, runner["lat"], runner["lon"])
-            if dist < min_distance:
-                min_distance = dist
-                nearest_runner = runner
+        nearest_id, min_distance = self.spatial_index.nearest(user_lat, user_lon)
+        nearest_runner = self.runners_by_id.get(nearest_id)
         
         if nearest_runner:
             return {
@@ -253,11 +1844,54 @@ class RunnerDatabase:
                 "lat": nearest_runner["lat"],
                 "lon": nearest_runner["lon"],
                 "status": nearest_runner["status"],
-                "history": nearest_runner.get("history", [])[-50:] if nearest_runner.get("history") else [],
+                "history": nearest_runner["history"].last(self.history_points),
                 "updated_at": datetime.now().isoformat()
             }, min_distance
         
         return None, None
+    
+    def find_nearest_runners(self, lats: np.ndarray, lons: np.ndarray) -> List[tuple]:
+        """
+        Find the nearest runner for each of many points in one vectorized pass
+        over a position snapshot (see nearest_rows).
+        Returns a list of (runner_summary, distance_in_km), (None, None) when empty.
+        """
+        ids, runner_lats, runner_lons = self.get_positions()
+        if len(ids) == 0:
+            return [(None, None)] * len(lats)
+        rows, distances = nearest_rows(lats, lons, runner_lats, runner_lons)
+        return self.nearest_matches(ids[rows], distances)
+    
+    def nearest_matches(self, ids: np.ndarray, distances: np.ndarray) -> List[tuple]:
+        """Pair runner ids with distances as (runner_summary, distance_in_km); (None, None) for removed runners"""
+        results = []
+        for runner_id, distance in zip(ids.tolist(), distances.tolist()):
+            runner = self.runners_by_id.get(runner_id)
+            results.append((self._runner_summary(runner), distance) if runner else (None, None))
+        return results
+    
+    def find_runners_nearby(self, lat: float, lon: float, k: Optional[int] = None,
+                            radius_km: Optional[float] = None, status: Optional[str] = None) -> List[dict]:
+        """
+        Find the k nearest runners and/or all runners within radius_km,
+        optionally only those with the given status. Sorted by distance.
+        """
+        predicate = (lambda runner_id: self.runners_by_id[runner_id]["status"] == status) if status else None
+        matches = self.spatial_index.search(lat, lon, k=k, radius_km=radius_km, predicate=predicate)
+        return [
+            dict(self._runner_summary(self.runners_by_id[runner_id]), distance_km=distance)
+            for runner_id, distance in matches
+        ]
+    
+    def _runner_summary(self, runner: dict) -> dict:
+        """Runner fields without history"""
+        return {
+            "id": runner["id"],
+            "name": runner["name"],
+            "lat": runner["lat"],
+            "lon": runner["lon"],
+            "status": runner["status"]
+        }
 
 
 # ==================== DATABASE METHODS FOR LOCATIONS ====================
@@ -317,19 +1951,614 @@ class RunnerDatabase:
         return len(self.user_saved_locations) < initial_len
 
 
-# ==================== ORDER MANAGEMENT DATABASE ====================
+class ColumnarRunnerDatabase(RunnerDatabase):
+    """
+    Runner database backed by contiguous NumPy columns.
+
+    Ids, positions, status codes and last-fix timestamps are stored in
+    parallel arrays so fleet-wide reads, nearest-runner search and
+    simulation ticks run as single vectorized operations. Each row costs
+    41 + 16 * history_capacity bytes (33 for the columns, 8 for the history
+    head/size counters, 16 per history slot; 1,641 bytes at the default
+    capacity of 100) plus its name.
+    """
+    
+    backend = "numpy"
+    
+    def _load_runners(self, seeds: List[dict]):
+        """Initialize runner columns from seed records"""
+        capacity = max(16, len(seeds))
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.lats = np.zeros(capacity, dtype=np.float64)
+        self.lons = np.zeros(capacity, dtype=np.float64)
+        self.status_codes = np.zeros(capacity, dtype=np.int8)
+        self.fix_ts = np.zeros(capacity, dtype=np.float64)  # timestamp of last ingested fix
+        self.statuses: List[str] = ["active", "inactive", "busy"]
+        self.names: List[str] = []
+        # Ring buffer per row: history[row, slot] = (lat, lon)
+        self.history = np.zeros((capacity, self.history_capacity, 2), dtype=np.float64)
+        self.history_head = np.zeros(capacity, dtype=np.int32)  # next slot to write
+        self.history_size = np.zeros(capacity, dtype=np.int32)
+        self.count = 0
+        self._rows: Dict[int, int] = {}  # runner id -> row
+        self.positions_version = 0  # bumped whenever any row moves, appears or disappears
+        self.grid_index = ColumnarGridIndex()
+        for r in seeds:
+            self.add_runner(r["id"], r["name"], r["lat"], r["lon"], r["status"])
+    
+    def _status_code(self, status: str) -> int:
+        """Map a status string to its int8 code"""
+        if status not in self.statuses:
+            self.statuses.append(status)
+        return self.statuses.index(status)
+    
+    def add_runner(self, runner_id: int, name: str, lat: float, lon: float, status: str = "active") -> Optional[dict]:
+        """Append a runner row, growing the columns when full; None if the id is taken"""
+        if runner_id in self._rows:
+            return None
+        if self.count == len(self.ids):
+            capacity = len(self.ids) * 2
+            for column in ("ids", "lats", "lons", "status_codes", "fix_ts",
+                           "history", "history_head", "history_size"):
+                old = getattr(self, column)
+                grown = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                grown[:self.count] = old[:self.count]
+                setattr(self, column, grown)
+        row = self.count
+        self.ids[row] = runner_id
+        self.lats[row] = lat
+        self.lons[row] = lon
+        self.status_codes[row] = self._status_code(status)
+        self.fix_ts[row] = -np.inf
+        self.names.append(name)
+        self.history_head[row] = 0
+        self.history_size[row] = 0
+        self._append_history(row, lat, lon)
+        self._rows[runner_id] = row
+        self.count += 1
+        self.positions_version += 1
+        return self._row_to_dict(row, datetime.now().isoformat())
+    
+    def remove_runner(self, runner_id: int) -> bool:
+        """Remove a runner row, shifting later rows down to keep insertion order"""
+        row = self._rows.pop(runner_id, None)
+        if row is None:
+            return False
+        n = self.count
+        for column in (self.ids, self.lats, self.lons, self.status_codes, self.fix_ts,
+                       self.history, self.history_head, self.history_size):
+            column[row:n - 1] = column[row + 1:n]
+        del self.names[row]
+        self.count -= 1
+        self.positions_version += 1
+        for shifted, shifted_id in enumerate(self.ids[row:self.count].tolist(), start=row):
+            self._rows[shifted_id] = shifted
+        return True
+    
+    def _row_to_dict(self, row: int, updated_at: str) -> dict:
+        """Build the API representation of one runner row"""
+        return {
+            "id": int(self.ids[row]),
+            "name": self.names[row],
+            "lat": float(self.lats[row]),
+            "lon": float(self.lons[row]),
+            "status": self.statuses[self.status_codes[row]],
+            "history": self._history_last(row),
+            "updated_at": updated_at
+        }
+    
+    def runner_count(self) -> int:
+        """Number of runners in the store"""
+        return self.count
+    
+    def get_positions(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get (ids, lats, lons) arrays for all runners"""
+        n = self.count
+        return self.ids[:n].copy(), self.lats[:n].copy(), self.lons[:n].copy()
+    
+    def get_all_runners(self) -> List[dict]:
+        """Get all runners with history"""
+        n = self.count
+        now = datetime.now().isoformat()
+        ids = self.ids[:n].tolist()
+        lats = self.lats[:n].tolist()
+        lons = self.lons[:n].tolist()
+        codes = self.status_codes[:n].tolist()
+        return [
+            {
+                "id": ids[i],
+                "name": self.names[i],
+                "lat": lats[i],
+                "lon": lons[i],
+                "status": self.statuses[codes[i]],
+                "history": self._history_last(i),
+                "updated_at": now
+            }
+            for i in range(n)
+        ]
+    
+    def get_runner(self, runner_id: int) -> Optional[dict]:
+        """Get specific runner"""
+        row = self._rows.get(runner_id)
+        if row is None:
+            return None
+        return self._row_to_dict(row, datetime.now().isoformat())
+    
+    def get_runners(self, runner_ids: List[int]) -> List[dict]:
+        """Get specific runners, skipping unknown ids"""
+        now = datetime.now().isoformat()
+        rows = (self._rows.get(runner_id) for runner_id in runner_ids)
+        return [self._row_to_dict(row, now) for row in rows if row is not None]
+    
+    def update_runner_position(self, runner_id: int, lat: float, lon: float):
+        """Update runner position and track history"""
+        row = self._rows.get(runner_id)
+        if row is not None:
+            self.lats[row] = lat
+            self.lons[row] = lon
+            self._append_history(row, lat, lon)
+            self.positions_version += 1
+            self._notify_positions(np.array([runner_id]), np.array([lat]), np.array([lon]))
+    
+    def update_positions(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray):
+        """Update positions for many runners in one vectorized assignment"""
+        rows = self._rows_for(ids)
+        known = rows >= 0
+        self._apply_rows(rows[known], lats[known], lons[known])
+        self._notify_positions(ids[known], lats[known], lons[known])
+    
+    def ingest_positions(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray,
+                         timestamps: np.ndarray) -> dict:
+        """Apply a batch of GPS fixes in timestamp order with vectorized filtering"""
+        order = np.argsort(timestamps, kind="stable")
+        ids, lats, lons, timestamps = ids[order], lats[order], lons[order], timestamps[order]
+        rows = self._rows_for(ids)
+        known = rows >= 0
+        valid = known & valid_fixes(lats, lons, timestamps)
+        fresh = valid.copy()
+        fresh[valid] = timestamps[valid] >= self.fix_ts[rows[valid]]
+        rows, timestamps = rows[fresh], timestamps[fresh]
+        np.maximum.at(self.fix_ts, rows, timestamps)
+        self._apply_rows(rows, lats[fresh], lons[fresh])
+        self._notify_positions(ids[fresh], lats[fresh], lons[fresh])
+        return {
+            "accepted": int(fresh.sum()),
+            "unknown": int((~known).sum()),
+            "invalid": int((known & ~valid).sum()),
+            "stale": int((valid & ~fresh).sum())
+        }
+    
+    def _rows_for(self, ids: np.ndarray) -> np.ndarray:
+        """Map runner ids to rows; unknown ids map to -1"""
+        n = self.count
+        if len(ids) == n and np.array_equal(ids, self.ids[:n]):
+            return np.arange(n)
+        return np.fromiter((self._rows.get(i, -1) for i in ids.tolist()), dtype=np.int64, count=len(ids))
+    
+    def _apply_rows(self, rows: np.ndarray, lats: np.ndarray, lons: np.ndarray):
+        """
+        Move rows to new positions and record history.
+        Rows may repeat; repeats are applied in order, one vectorized pass per
+        repeat level, so each runner ends at its last point.
+        """
+        if len(np.unique(rows)) == len(rows):
+            levels = [slice(None)]
+        else:
+            by_row = np.argsort(rows, kind="stable")
+            sorted_rows = rows[by_row]
+            group_start = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+            group_sizes = np.diff(np.r_[group_start, len(rows)])
+            rank = np.empty(len(rows), dtype=np.int64)
+            rank[by_row] = np.arange(len(rows)) - np.repeat(group_start, group_sizes)
+            levels = [rank == level for level in range(int(rank.max()) + 1)]
+        for level in levels:
+            level_rows, level_lats, level_lons = rows[level], lats[level], lons[level]
+            self.lats[level_rows] = level_lats
+            self.lons[level_rows] = level_lons
+            self._append_history_rows(level_rows, level_lats, level_lons)
+        self.positions_version += 1
+    
+    def _append_history(self, row: int, lat: float, lon: float):
+        """Write one point into a row's ring buffer"""
+        head = self.history_head[row]
+        self.history[row, head, 0] = lat
+        self.history[row, head, 1] = lon
+        self.history_head[row] = (head + 1) % self.history_capacity
+        if self.history_size[row] < self.history_capacity:
+            self.history_size[row] += 1
+    
+    def _append_history_rows(self, rows: np.ndarray, lats: np.ndarray, lons: np.ndarray):
+        """Write one point into each of many distinct rows' ring buffers"""
+        heads = self.history_head[rows]
+        self.history[rows, heads, 0] = lats
+        self.history[rows, heads, 1] = lons
+        self.history_head[rows] = (heads + 1) % self.history_capacity
+        self.history_size[rows] = np.minimum(self.history_size[rows] + 1, self.history_capacity)
+    
+    def _history_last(self, row: int) -> List[List[float]]:
+        """Get a row's most recent history points, oldest first"""
+        k = min(self.history_points, int(self.history_size[row]))
+        slots = (self.history_head[row] - k + np.arange(k)) % self.history_capacity
+        return self.history[row, slots].tolist()
+    
+    def find_nearest_runner(self, user_lat: float, user_lon: float) -> tuple:
+        """
+        Find nearest runner to user location with one vectorized distance pass.
+        Returns (runner_data, distance_in_km)
+        """
+        if self.count == 0:
+            return None, None
+        distances = haversine_distances(user_lat, user_lon, self.lats[:self.count], self.lons[:self.count])
+        row = int(np.argmin(distances))
+        return self._row_to_dict(row, datetime.now().isoformat()), float(distances[row])
+    
+    def nearest_matches(self, ids: np.ndarray, distances: np.ndarray) -> List[tuple]:
+        """Pair runner ids with distances as (runner_summary, distance_in_km); (None, None) for removed runners"""
+        rows = self._rows_for(ids)
+        known = rows >= 0
+        safe_rows = np.where(known, rows, 0)
+        runner_lats = self.lats[safe_rows].tolist()
+        runner_lons = self.lons[safe_rows].tolist()
+        codes = self.status_codes[safe_rows].tolist()
+        return [
+            ({
+                "id": runner_id,
+                "name": self.names[row],
+                "lat": runner_lats[i],
+                "lon": runner_lons[i],
+                "status": self.statuses[codes[i]]
+            }, distance) if row >= 0 else (None, None)
+            for i, (runner_id, row, distance) in enumerate(zip(ids.tolist(), rows.tolist(), distances.tolist()))
+        ]
+    
+    def find_runners_nearby(self, lat: float, lon: float, k: Optional[int] = None,
+                            radius_km: Optional[float] = None, status: Optional[str] = None) -> List[dict]:
+        """
+        Find the k nearest runners and/or all runners within radius_km,
+        optionally only those with the given status. Sorted by distance.
+        """
+        n = self.count
+        if self.grid_index.version != self.positions_version:
+            self.grid_index.rebuild(self.lats[:n], self.lons[:n], self.positions_version)
+        mask = None
+        if status:
+            if status not in self.statuses:
+                return []
+            mask = self.status_codes[:n] == self.statuses.index(status)
+        rows, distances = self.grid_index.search(lat, lon, self.lats, self.lons, k=k, radius_km=radius_km, mask=mask)
+        ids = self.ids[rows].tolist()
+        lats = self.lats[rows].tolist()
+        lons = self.lons[rows].tolist()
+        codes = self.status_codes[rows].tolist()
+        return [
+            {
+                "id": ids[i],
+                "name": self.names[row],
+                "lat": lats[i],
+                "lon": lons[i],
+                "status": self.statuses[codes[i]],
+                "distance_km": distance
+            }
+            for i, (row, distance) in enumerate(zip(rows.tolist(), distances.tolist()))
+        ]
+
+
+# ==================== VIEWPORT CLUSTERING ====================
+
+# Cluster radius in screen pixels, and the zoom from which runners are never clustered
+CLUSTER_RADIUS_PX = 60
+CLUSTER_MAX_ZOOM = 16
+
+
+class RunnerViewportCache:
+    """
+    Per-tick runner snapshot with zoom-level clusters for map viewports.
+
+    Runners are grouped into grid cells of CLUSTER_RADIUS_PX pixels in Web
+    Mercator space (supercluster style). Each zoom level is clustered once
+    per positions version for the whole fleet; requests only filter the
+    cached result by their bounding box.
+    """
+    
+    def __init__(self, store: RunnerDatabase, radius_px: int = CLUSTER_RADIUS_PX, max_zoom: int = CLUSTER_MAX_ZOOM):
+        self.store = store
+        self.radius_px = radius_px
+        self.max_zoom = max_zoom
+        self.version = None
+        self.ids = self.lats = self.lons = np.empty(0)
+        self.levels: Dict[int, dict] = {}  # zoom -> clusters for current version
+    
+    def _refresh(self):
+        """Take a new snapshot when runner positions have changed"""
+        if self.version != self.store.positions_version:
+            self.version = self.store.positions_version
+            self.ids, self.lats, self.lons = self.store.get_positions()
+            self.levels = {}
+    
+    def _level(self, zoom: int) -> dict:
+        """Clusters for one zoom level, computed once per version"""
+        level = self.levels.get(zoom)
+        if level is not None:
+            return level
+        
+        cells = 256 * 2 ** zoom / self.radius_px  # cluster cells across the world
+        x = (self.lons + 180) / 360
+        sin_lat = np.sin(np.radians(np.clip(self.lats, -85.05112878, 85.05112878)))
+        y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+        cx = np.floor(x * cells).astype(np.int64)
+        cy = np.floor(y * cells).astype(np.int64)
+        codes = cx * (int(cells) + 2) + cy
+        
+        cell_codes, inverse, counts = np.unique(codes, return_inverse=True, return_counts=True)
+        grouped = counts >= 2
+        level = {
+            "cluster_ids": cell_codes[grouped],
+            "lats": (np.bincount(inverse, weights=self.lats) / counts)[grouped],
+            "lons": (np.bincount(inverse, weights=self.lons) / counts)[grouped],
+            "counts": counts[grouped],
+            "single": counts[inverse] == 1  # runners drawn individually
+        }
+        self.levels[zoom] = level
+        return level
+    
+    def query(self, bbox: Optional[Tuple[float, float, float, float]], zoom: Optional[int]) -> Tuple[List[int], List[dict]]:
+        """
+        Runners and clusters to draw for a viewport.
+        Returns (runner_ids, clusters); runners are not clustered at max_zoom and above.
+        """
+        self._refresh()
+        if zoom is None or zoom >= self.max_zoom:
+            in_view = bbox_mask(self.lats, self.lons, bbox)
+            return self.ids[in_view].tolist(), []
+        
+        level = self._level(zoom)
+        singles = level["single"] & bbox_mask(self.lats, self.lons, bbox)
+        in_view = bbox_mask(level["lats"], level["lons"], bbox)
+        clusters = [
+            {"cluster_id": cluster_id, "lat": lat, "lon": lon, "count": count}
+            for cluster_id, lat, lon, count in zip(
+                level["cluster_ids"][in_view].tolist(), level["lats"][in_view].tolist(),
+                level["lons"][in_view].tolist(), level["counts"][in_view].tolist()
+            )
+        ]
+        return self.ids[singles].tolist(), clusters
+
+
+# ==================== LIVE POSITION STREAM ====================
+
+# Frames buffered per stream client before it is dropped as too slow
+STREAM_CLIENT_QUEUE_SIZE = 64
+# Seconds between keepalive comments on an idle stream
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+class StreamSubscriber:
+    """One connected stream client and its bounded frame queue"""
+    
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class RunnerStreamHub:
+    """
+    Fans runner position changes out to Server-Sent Events subscribers.
+
+    Registered as a runner store position listener: each batch (simulation
+    tick or ingest) is serialized once into an SSE frame holding only the
+    changed runners, and the same bytes are queued for every subscriber.
+    A subscriber whose queue is full is dropped rather than buffered.
+    """
+    
+    def __init__(self, queue_size: int = STREAM_CLIENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: set = set()
+        self.sequence = 0
+        self.frames_sent = 0
+        self.clients_dropped = 0
+    
+    def subscribe(self) -> StreamSubscriber:
+        """Register a new stream client"""
+        subscriber = StreamSubscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: StreamSubscriber):
+        """Forget a stream client"""
+        self.subscribers.discard(subscriber)
+    
+    @staticmethod
+    def encode_frame(event: str, sequence: int, runners: List[list]) -> bytes:
+        """Serialize [[id, lat, lon], ...] as one SSE frame"""
+        data = json.dumps({"seq": sequence, "runners": runners}, separators=(",", ":"))
+        return f"id: {sequence}\nevent: {event}\ndata: {data}\n\n".encode()
+    
+    def publish(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray):
+        """Position listener: send one frame of changed runners to all subscribers"""
+        self.sequence += 1
+        if not self.subscribers:
+            return
+        # Keep only the latest position of runners that moved more than once
+        latest = {runner_id: [runner_id, lat, lon]
+                  for runner_id, lat, lon in zip(ids.tolist(), lats.tolist(), lons.tolist())}
+        frame = self.encode_frame("positions", self.sequence, list(latest.values()))
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(frame)
+                self.frames_sent += 1
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+    
+    def _drop(self, subscriber: StreamSubscriber):
+        """Disconnect a subscriber that cannot keep up"""
+        self.subscribers.discard(subscriber)
+        subscriber.dropped = True
+        self.clients_dropped += 1
+        # Replace the backlog with a wake-up so the stream ends promptly
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+
+# ==================== DRIVING-TIME RANKING ====================
+
+# How order creation picks its runner: "driving" (OSRM table over a haversine shortlist) or
+# "haversine" (straight line). GET /api/user/nearest-runner ranks by haversine unless asked otherwise.
+ORDER_RUNNER_RANKING = os.environ.get("ORDER_RUNNER_RANKING", "driving")
+DRIVING_RANK_CANDIDATES = int(os.environ.get("DRIVING_RANK_CANDIDATES", "10"))
+DRIVING_RANK_CACHE_TTL_SECONDS = float(os.environ.get("DRIVING_RANK_CACHE_TTL_SECONDS", "30"))
+DRIVING_RANK_GEOHASH_PRECISION = int(os.environ.get("DRIVING_RANK_GEOHASH_PRECISION", "7"))
+
+
+class DrivingTimeRanker:
+    """
+    Ranks runners by driving time to a point.
+    
+    The k nearest runners by haversine are shortlisted, then one OSRM table
+    request gives driving times for all of them. Rankings are cached per
+    geohash cell of the destination for a short TTL, and concurrent lookups
+    for the same cell share one table request.
+    """
+    
+    def __init__(
+        self,
+        store: "RunnerDatabase",
+        client: OSRMClient,
+        candidates: int = DRIVING_RANK_CANDIDATES,
+        ttl: float = DRIVING_RANK_CACHE_TTL_SECONDS,
+        precision: int = DRIVING_RANK_GEOHASH_PRECISION
+    ):
+        self.store = store
+        self.client = client
+        self.candidates = max(1, candidates)
+        self.precision = precision
+        self.cache = RouteCache(ttl=ttl, max_entries=ROUTE_CACHE_MAX_ENTRIES)
+        self.flights = SingleFlight()
+        self.fallbacks = 0
+    
+    async def rank(self, lat: float, lon: float) -> List[dict]:
+        """
+        Shortlisted runners ordered by driving time to (lat, lon).
+        Each entry is a runner summary plus distance_km (straight line),
+        duration_min and driving_distance_km (None when OSRM had no answer,
+        in which case the haversine order is kept).
+        """
+        cell = geohash_encode(lat, lon, self.precision)
+        cached = self.cache.get(cell)
+        if cached is not None:
+            return cached["rankings"]
+        return await self.flights.do(cell, lambda: self._fetch(cell, lat, lon))
+    
+    async def _fetch(self, cell: str, lat: float, lon: float) -> List[dict]:
+        shortlist = self.store.find_runners_nearby(lat, lon, k=self.candidates)
+        if not shortlist:
+            return []
+        
+        table = await self.client.table([(r["lat"], r["lon"]) for r in shortlist], lat, lon)
+        if table is None:
+            # OSRM unavailable: keep the straight-line order and don't cache it
+            self.fallbacks += 1
+            return [dict(r, duration_min=None, driving_distance_km=None) for r in shortlist]
+        
+        rankings = [
+            dict(r, duration_min=duration, driving_distance_km=distance)
+            for r, (duration, distance) in zip(shortlist, table)
+        ]
+        # Unroutable runners go last, in straight-line order
+        rankings.sort(key=lambda r: (r["duration_min"] is None, r["duration_min"] or 0.0, r["distance_km"]))
+        self.cache.put(cell, {"rankings": rankings})
+        return rankings
+    
+    def stats(self) -> dict:
+        """Ranking counters for the health endpoint"""
+        return dict(
+            self.cache.stats(),
+            table_requests=self.flights.calls,
+            coalesced=self.flights.coalesced,
+            fallbacks=self.fallbacks
+        )
+
+
+# ==================== ORDER MANAGEMENT DATABASE ====================
+
+# Order changes kept for /api/orders/changes; older cursors get a reset
+ORDER_CHANGE_LOG_SIZE = int(os.environ.get("ORDER_CHANGE_LOG_SIZE", "10000"))
+
+ORDER_STATUSES = ("pending", "approved", "assigned", "completed", "rejected")
+
 
 class OrderDatabase:
     """In-memory order database for delivery requests"""
     
-    def __init__(self):
+    def __init__(self, change_log_size: int = ORDER_CHANGE_LOG_SIZE):
         self.orders: dict = {}  # order_id -> order data
         self.order_counter = 0
+        self.version = 0  # bumped on every order change; each order keeps the version of its last change
+        self._waiters: Dict[str, List[asyncio.Future]] = {}  # order_id -> pending long-polls
+        # change_log[i] is the order_id changed at version change_log_base + i + 1
+        self.change_log_size = max(1, change_log_size)
+        self.change_log: List[str] = []
+        self.change_log_base = 0
+        # Creation ordering: sequence n (1-based) is created_ids[n - 1], created at created_times[n - 1]
+        self.created_ids: List[str] = []
+        self.created_times = array("d")  # unix timestamps
+        # status -> sorted creation sequences of the orders currently in that status
+        self.status_index: Dict[str, List[int]] = {status: [] for status in ORDER_STATUSES}
+        self._seq: Dict[str, int] = {}  # order_id -> creation sequence
+        self.approval_listeners: List[Callable[[dict], None]] = []
+        self.change_listeners: List[Callable[[dict], None]] = []
+    
+    def add_change_listener(self, listener: Callable[[dict], None]):
+        """Register a callback receiving each order after every versioned change"""
+        self.change_listeners.append(listener)
+    
+    def add_approval_listener(self, listener: Callable[[dict], None]):
+        """Register a callback receiving each order as it is approved"""
+        self.approval_listeners.append(listener)
+    
+    def _record_change(self, order: dict):
+        """Stamp an order with a new version, log it and wake anyone waiting on it"""
+        self.version += 1
+        order["version"] = self.version
+        self.change_log.append(order["order_id"])
+        # Trim in chunks so the amortized cost per change stays O(1)
+        excess = len(self.change_log) - self.change_log_size
+        if excess >= self.change_log_size // 2 + 1:
+            del self.change_log[:excess]
+            self.change_log_base += excess
+        for waiter in self._waiters.pop(order["order_id"], []):
+            if not waiter.done():
+                waiter.set_result(order)
+        for listener in self.change_listeners:
+            listener(order)
+    
+    async def wait_for_change(self, order_id: str, since_version: int, timeout: float) -> Optional[dict]:
+        """
+        Wait until an order's version passes since_version or timeout expires.
+        Returns the order (changed or not), or None if it does not exist.
+        """
+        order = self.orders.get(order_id)
+        if order is None or order["version"] > since_version or timeout <= 0:
+            return order
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(order_id, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return order
+        finally:
+            waiters = self._waiters.get(order_id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._waiters[order_id]
     
-    def create_order(self, user_lat: float, user_lng: float, runner_data: dict, distance_km: float) -> dict:
-        """Create a new delivery order"""
+    def create_order(self, user_lat: float, user_lng: float, runner_data: dict, distance_km: float,
+                     duration_min: Optional[float] = None, driving_distance_km: Optional[float] = None) -> dict:
+        """Create a new delivery order (driving distance and time to the runner, if known)"""
         self.order_counter += 1
         order_id = f"ORD-{self.order_counter:05d}"
+        created = datetime.now()
         
         order = {
             "order_id": order_id,
@@ -341,27 +2570,125 @@ class OrderDatabase:
             "nearest_runner_lat": runner_data["lat"],
             "nearest_runner_lng": runner_data["lon"],
             "distance_km": round(distance_km, 2),
-            "created_time": datetime.now().isoformat(),
-            "updated_time": datetime.now().isoformat()
+            "driving_distance_km": round(driving_distance_km, 2) if driving_distance_km is not None else None,
+            "duration_min": round(duration_min, 1) if duration_min is not None else None,
+            "created_time": created.isoformat(),
+            "updated_time": created.isoformat()
         }
         
         self.orders[order_id] = order
+        self.created_ids.append(order_id)
+        self.created_times.append(created.timestamp())
+        self._seq[order_id] = self.order_counter
+        self.status_index["pending"].append(self.order_counter)
+        self._record_change(order)
         return order
     
     def get_order(self, order_id: str) -> Optional[dict]:
         """Get order by ID"""
         return self.orders.get(order_id)
     
+    def _set_status(self, order: dict, status: str):
+        """
+        Move an order between status indexes.
+        Each move shifts the tail of two sorted lists: O(orders created after
+        this one in each status). Orders usually change status soon after
+        creation and the large completed/rejected lists only receive entries,
+        so the shifted tails stay short.
+        """
+        seq = self._seq[order["order_id"]]
+        old = self.status_index[order["status"]]
+        i = bisect.bisect_left(old, seq)
+        if i < len(old) and old[i] == seq:
+            del old[i]
+        bisect.insort(self.status_index[status], seq)
+        order["status"] = status
+    
+    def get_changes(self, since: int) -> Tuple[List[dict], int, bool]:
+        """
+        Get orders created or changed after version `since`.
+        Returns (orders, cursor, reset): orders in the order of their latest
+        change, the cursor to pass next time, and reset=True when `since` is
+        older than the change log or newer than the current version (a cursor
+        from before a server restart); the caller should reload its full view.
+        Cost is O(changes since the cursor), not O(all orders).
+        """
+        if since > self.version or since < self.change_log_base:
+            return [], self.version, True
+        if since == self.version:
+            return [], self.version, False
+        
+        seen = set()
+        changed = []
+        for order_id in reversed(self.change_log[max(since, 0) - self.change_log_base:]):
+            if order_id not in seen:
+                seen.add(order_id)
+                changed.append(self.orders[order_id])
+        changed.reverse()
+        return changed, self.version, False
+    
     def get_pending_orders(self) -> List[dict]:
         """Get all pending orders"""
-        return [o for o in self.orders.values() if o["status"] == "pending"]
+        return [self.orders[self.created_ids[seq - 1]] for seq in self.status_index["pending"]]
+    
+    def list_orders(
+        self,
+        status: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 50,
+        cursor: Optional[int] = None
+    ) -> Tuple[List[dict], Optional[int]]:
+        """
+        List orders in creation order, answered from the status index.
+        since is a unix timestamp (orders created at or after it); cursor is the
+        next_cursor of the previous page. Returns (orders, next_cursor), with
+        next_cursor None on the last page.
+        """
+        start = 1 if cursor is None else cursor + 1
+        if since is not None:
+            start = max(start, bisect.bisect_left(self.created_times, since) + 1)
+        
+        if status is None:
+            seqs = range(start, min(start + limit, len(self.created_ids) + 1))
+            has_more = start + limit <= len(self.created_ids)
+        else:
+            index = self.status_index[status]
+            i = bisect.bisect_left(index, start)
+            seqs = index[i:i + limit]
+            has_more = i + limit < len(index)
+        
+        orders = [self.orders[self.created_ids[seq - 1]] for seq in seqs]
+        next_cursor = seqs[-1] if has_more and orders else None
+        return orders, next_cursor
     
     def approve_order(self, order_id: str) -> Optional[dict]:
         """Approve a pending order"""
         order = self.orders.get(order_id)
         if order and order["status"] == "pending":
-            order["status"] = "approved"
+            self._set_status(order, "approved")
+            order["updated_time"] = datetime.now().isoformat()
+            self._record_change(order)
+            for listener in self.approval_listeners:
+                listener(order)
+            return order
+        return None
+    
+    def set_eta(self, order_id: str, eta: dict) -> Optional[dict]:
+        """Update an order's live ETA"""
+        order = self.orders.get(order_id)
+        if order:
+            order["eta"] = eta
+            self._record_change(order)
+            return order
+        return None
+    
+    def set_route(self, order_id: str, route: dict) -> Optional[dict]:
+        """Attach a computed delivery route to an approved or assigned order"""
+        order = self.orders.get(order_id)
+        if order and order["status"] in ("approved", "assigned"):
+            order["route"] = route
             order["updated_time"] = datetime.now().isoformat()
+            self._record_change(order)
             return order
         return None
     
@@ -369,8 +2696,9 @@ class OrderDatabase:
         """Mark order as assigned"""
         order = self.orders.get(order_id)
         if order and order["status"] == "approved":
-            order["status"] = "assigned"
+            self._set_status(order, "assigned")
             order["updated_time"] = datetime.now().isoformat()
+            self._record_change(order)
             return order
         return None
     
@@ -378,8 +2706,9 @@ class OrderDatabase:
         """Mark order as completed"""
         order = self.orders.get(order_id)
         if order:
-            order["status"] = "completed"
+            self._set_status(order, "completed")
             order["updated_time"] = datetime.now().isoformat()
+            self._record_change(order)
             return order
         return None
     
@@ -387,12 +2716,605 @@ class OrderDatabase:
         """Reject a pending order"""
         order = self.orders.get(order_id)
         if order and order["status"] == "pending":
-            order["status"] = "rejected"
+            self._set_status(order, "rejected")
             order["updated_time"] = datetime.now().isoformat()
+            self._record_change(order)
             return order
         return None
 
 
+# ==================== LIVE ETA TRACKING ====================
+
+# Distance from the route beyond which a fix counts as off-route, and how many such fixes trigger a re-route
+ETA_CORRIDOR_M = float(os.environ.get("ETA_CORRIDOR_M", "75"))
+ETA_OFF_ROUTE_FIXES = 2
+ETA_REROUTE_MIN_SECONDS = 30.0
+# Route stretch searched around the last progress point: behind / ahead, in meters
+ETA_SNAP_BACK_M = 100.0
+ETA_SNAP_AHEAD_M = 1500.0
+# Order versions are bumped for ETA changes of at least this much
+ETA_PUBLISH_MIN_CHANGE_M = 50.0
+
+
+class TrackedRoute:
+    """An order's route projected to local meters, with cumulative segment lengths"""
+    
+    __slots__ = ("order_id", "runner_id", "route", "x", "y", "dx", "dy", "seg_len2", "cum",
+                 "cos_lat", "total_m", "duration_min", "progress_m", "published_m",
+                 "published_off_route", "off_route_fixes", "last_reroute")
+    
+    def __init__(self, order: dict):
+        self.order_id = order["order_id"]
+        self.runner_id = order["nearest_runner_id"]
+        self.route = order["route"]
+        coords = np.asarray(self.route["geometry"]["coordinates"], dtype=np.float64).reshape(-1, 2)
+        self.cos_lat = math.cos(math.radians(float(coords[:, 1].mean())))
+        self.x = coords[:, 0] * (111320.0 * self.cos_lat)
+        self.y = coords[:, 1] * 110540.0
+        self.dx = np.diff(self.x)
+        self.dy = np.diff(self.y)
+        self.seg_len2 = self.dx * self.dx + self.dy * self.dy
+        self.cum = np.concatenate(([0.0], np.cumsum(np.sqrt(self.seg_len2))))
+        self.total_m = float(self.cum[-1])
+        self.duration_min = self.route["duration_min"]
+        self.progress_m = 0.0
+        self.published_m = -math.inf
+        self.published_off_route = False
+        self.off_route_fixes = 0
+        self.last_reroute = -math.inf
+    
+    def snap(self, lat: float, lon: float) -> Tuple[float, float]:
+        """
+        Project a fix onto the route near the current progress point.
+        Only segments within [progress - back, progress + ahead] are checked;
+        they are found by binary search on the cumulative lengths.
+        Returns (distance along the route, distance from the route) in meters.
+        """
+        n_seg = len(self.dx)
+        if n_seg == 0:
+            return 0.0, math.hypot(lon * 111320.0 * self.cos_lat - self.x[0], lat * 110540.0 - self.y[0])
+        lo = max(int(np.searchsorted(self.cum, self.progress_m - ETA_SNAP_BACK_M, side="right")) - 1, 0)
+        hi = min(int(np.searchsorted(self.cum, self.progress_m + ETA_SNAP_AHEAD_M, side="left")) + 1, n_seg)
+        
+        px = lon * 111320.0 * self.cos_lat - self.x[lo:hi]
+        py = lat * 110540.0 - self.y[lo:hi]
+        dx, dy, len2 = self.dx[lo:hi], self.dy[lo:hi], self.seg_len2[lo:hi]
+        t = np.clip(np.divide(px * dx + py * dy, len2, out=np.zeros_like(len2), where=len2 > 0), 0.0, 1.0)
+        offsets = np.hypot(px - t * dx, py - t * dy)
+        i = int(np.argmin(offsets))
+        along = float(self.cum[lo + i] + t[i] * math.sqrt(len2[i]))
+        return along, float(offsets[i])
+
+
+class OrderEtaTracker:
+    """
+    Keeps live ETAs for orders with a stored route.
+    
+    Runner position batches are snapped onto each tracked order's route
+    polyline to advance its progress; remaining distance and ETA follow from
+    the cumulative segment lengths, without calling the routing backend. A
+    runner that stays outside the deviation corridor gets one re-route via
+    the reroute callback.
+    """
+    
+    ACTIVE_STATUSES = ("approved", "assigned")
+    
+    def __init__(self, orders: "OrderDatabase", reroute: Callable[[dict, float, float], None]):
+        self.orders = orders
+        self.reroute = reroute
+        self.tracked: Dict[str, TrackedRoute] = {}  # order_id -> tracked route
+        self.by_runner: Dict[int, List[str]] = {}  # runner_id -> tracked order ids
+        self._runner_ids = np.empty(0, dtype=np.int64)
+        self.fixes = 0
+        self.reroutes = 0
+        self.update_seconds = 0.0
+    
+    def _index_runners(self):
+        self._runner_ids = np.fromiter(self.by_runner.keys(), dtype=np.int64, count=len(self.by_runner))
+    
+    def _untrack(self, order_id: str):
+        tracked = self.tracked.pop(order_id, None)
+        if tracked is None:
+            return
+        order_ids = self.by_runner.get(tracked.runner_id, [])
+        if order_id in order_ids:
+            order_ids.remove(order_id)
+        if not order_ids:
+            self.by_runner.pop(tracked.runner_id, None)
+        self._index_runners()
+    
+    def on_order_change(self, order: dict):
+        """Order change listener: start, refresh or stop tracking an order"""
+        order_id = order["order_id"]
+        tracked = self.tracked.get(order_id)
+        if order["status"] not in self.ACTIVE_STATUSES or not order.get("route"):
+            if tracked is not None:
+                self._untrack(order_id)
+            return
+        if tracked is not None and tracked.route is order["route"]:
+            return
+        # New or re-computed route: track it from its start
+        last_reroute = tracked.last_reroute if tracked is not None else -math.inf
+        if tracked is not None:
+            self._untrack(order_id)
+        tracked = TrackedRoute(order)
+        tracked.last_reroute = last_reroute
+        self.tracked[order_id] = tracked
+        self.by_runner.setdefault(tracked.runner_id, []).append(order_id)
+        self._index_runners()
+    
+    def on_positions(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray):
+        """Position listener: advance every tracked order whose runner moved"""
+        if not self.tracked:
+            return
+        started = time.perf_counter()
+        rows = np.flatnonzero(np.isin(ids, self._runner_ids))
+        for row in rows.tolist():
+            runner_id = int(ids[row])
+            for order_id in list(self.by_runner.get(runner_id, ())):
+                self._advance(self.tracked[order_id], float(lats[row]), float(lons[row]))
+        self.fixes += len(rows)
+        self.update_seconds += time.perf_counter() - started
+    
+    def _advance(self, tracked: TrackedRoute, lat: float, lon: float):
+        along, offset = tracked.snap(lat, lon)
+        off_route = offset > ETA_CORRIDOR_M
+        if off_route:
+            tracked.off_route_fixes += 1
+            now = time.monotonic()
+            # At most one re-route per ETA_REROUTE_MIN_SECONDS, also while one is in flight
+            if (tracked.off_route_fixes >= ETA_OFF_ROUTE_FIXES
+                    and now - tracked.last_reroute >= ETA_REROUTE_MIN_SECONDS):
+                tracked.last_reroute = now
+                self.reroutes += 1
+                self.reroute(self.orders.get_order(tracked.order_id), lat, lon)
+        else:
+            tracked.off_route_fixes = 0
+            tracked.progress_m = along
+        
+        remaining_m = max(tracked.total_m - tracked.progress_m, 0.0)
+        if (abs(remaining_m - tracked.published_m) < ETA_PUBLISH_MIN_CHANGE_M
+                and off_route == tracked.published_off_route):
+            return
+        tracked.published_m = remaining_m
+        tracked.published_off_route = off_route
+        fraction = remaining_m / tracked.total_m if tracked.total_m > 0 else 0.0
+        self.orders.set_eta(tracked.order_id, {
+            "remaining_km": round(remaining_m / 1000, 2),
+            "eta_min": round(tracked.duration_min * fraction, 1),
+            "progress": round(1.0 - fraction, 3),
+            "off_route": off_route,
+            "updated_time": datetime.now().isoformat()
+        })
+    
+    def stats(self) -> dict:
+        """Tracker counters for the health endpoint"""
+        return {
+            "tracked_orders": len(self.tracked),
+            "fixes": self.fixes,
+            "reroutes": self.reroutes,
+            "avg_update_us": round(self.update_seconds / self.fixes * 1e6, 1) if self.fixes else 0.0
+        }
+
+
+# ==================== RUNNER SIMULATION ====================
+
+SIMULATION_TICK_SECONDS = float(os.environ.get("SIMULATION_TICK_SECONDS", "3"))
+# Total simulated fleet; synthetic runners are added around the seed runners (0 = seed runners only)
+SIMULATION_FLEET_SIZE = int(os.environ.get("SIMULATION_FLEET_SIZE", "0"))
+SIMULATION_SEED = int(os.environ.get("SIMULATION_SEED", "42"))
+# Where the simulation runs: "task" (on the API event loop), "thread", "process" or "off"
+SIMULATION_MODE = os.environ.get("SIMULATION_MODE", "task")
+# Position buffers shared with a thread/process worker; a tick is skipped when none is free
+SIMULATION_BUFFERS = 3
+
+
+class RunnerSimulator:
+    """
+    Vectorized random-walk simulation of the whole fleet.
+    
+    Each runner keeps a heading and a speed; every tick the headings drift,
+    and all runners move in one NumPy step. A seeded generator makes runs
+    reproducible. step() works on plain arrays, so it does not need the store.
+    """
+    
+    SPEED_KMH = (8.0, 25.0)
+    HEADING_DRIFT_RAD = 0.4  # std-dev of the heading change per second
+    METERS_PER_DEG_LAT = 110540.0
+    METERS_PER_DEG_LON = 111320.0
+    
+    def __init__(self, seed: int = SIMULATION_SEED):
+        self.rng = np.random.default_rng(seed)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._heading = np.empty(0)
+        self._speed = np.empty(0)  # meters per second
+        self.ticks = 0
+        self.last_tick_ms = 0.0
+        self.max_tick_ms = 0.0
+        self.total_tick_ms = 0.0
+    
+    def _sync(self, ids: np.ndarray):
+        """Keep per-runner heading/speed aligned with the current id order"""
+        if len(ids) == len(self._ids) and np.array_equal(ids, self._ids):
+            return
+        heading = self.rng.uniform(0, 2 * math.pi, len(ids))
+        speed = self.rng.uniform(*self.SPEED_KMH, len(ids)) / 3.6
+        if len(self._ids):
+            # Runners that were already simulated keep their motion
+            order = np.argsort(self._ids)
+            pos = np.searchsorted(self._ids, ids, sorter=order).clip(0, len(self._ids) - 1)
+            old = order[pos]
+            known = self._ids[old] == ids
+            heading[known] = self._heading[old[known]]
+            speed[known] = self._speed[old[known]]
+        self._ids, self._heading, self._speed = ids.copy(), heading, speed
+    
+    def step(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray, dt: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Advance every runner by dt seconds; returns the new (lats, lons)"""
+        self._sync(ids)
+        self._heading += self.rng.normal(0.0, self.HEADING_DRIFT_RAD * math.sqrt(dt), len(ids))
+        meters = self._speed * dt
+        new_lats = lats + meters * np.cos(self._heading) / self.METERS_PER_DEG_LAT
+        new_lons = lons + meters * np.sin(self._heading) / (self.METERS_PER_DEG_LON * np.cos(np.radians(lats)))
+        # Reflect off the poles rather than producing invalid latitudes
+        over = np.abs(new_lats) > 89.9
+        new_lats[over] = lats[over]
+        self._heading[over] += math.pi
+        new_lons = (new_lons + 180.0) % 360.0 - 180.0
+        return new_lats, new_lons
+    
+    def spawn_fleet(self, store: "RunnerDatabase", size: int, spread_km: float = 5.0) -> int:
+        """Add synthetic runners around the existing ones until the store holds `size`; returns how many"""
+        ids, lats, lons = store.get_positions()
+        missing = size - len(ids)
+        if missing <= 0:
+            return 0
+        center_lat = float(lats.mean()) if len(lats) else SEED_RUNNERS[0]["lat"]
+        center_lon = float(lons.mean()) if len(lons) else SEED_RUNNERS[0]["lon"]
+        spread_deg = spread_km * 1000 / self.METERS_PER_DEG_LAT
+        new_lats = center_lat + self.rng.normal(0.0, spread_deg, missing)
+        new_lons = center_lon + self.rng.normal(0.0, spread_deg / math.cos(math.radians(center_lat)), missing)
+        next_id = int(ids.max()) + 1 if len(ids) else 1
+        for offset, (lat, lon) in enumerate(zip(new_lats.tolist(), new_lons.tolist())):
+            store.add_runner(next_id + offset, f"Runner {next_id + offset}", lat, lon)
+        return missing
+    
+    def record_tick(self, seconds: float):
+        tick_ms = seconds * 1000
+        self.ticks += 1
+        self.last_tick_ms = tick_ms
+        self.max_tick_ms = max(self.max_tick_ms, tick_ms)
+        self.total_tick_ms += tick_ms
+    
+    def stats(self) -> dict:
+        """Tick counters for the health endpoint"""
+        return {
+            "runners": len(self._ids),
+            "tick_seconds": SIMULATION_TICK_SECONDS,
+            "ticks": self.ticks,
+            "last_tick_ms": round(self.last_tick_ms, 2),
+            "avg_tick_ms": round(self.total_tick_ms / self.ticks, 2) if self.ticks else 0.0,
+            "max_tick_ms": round(self.max_tick_ms, 2)
+        }
+
+
+def simulation_worker(buffers: Union[np.ndarray, str], ids: np.ndarray, lats: np.ndarray, lons: np.ndarray,
+                      seed: int, tick_seconds: float, free: Any, ready: Any, stop: Any):
+    """
+    Simulation loop for a worker thread or process.
+    Each tick is written into a free (n_buffers, 2, n) position buffer and its
+    index sent on `ready` as (index, tick_ms); the consumer hands the index
+    back on `free` once it has copied the positions out. `buffers` is the
+    array itself (thread) or the name of its shared memory block (process).
+    """
+    shm = None
+    if isinstance(buffers, str):
+        shm = shared_memory.SharedMemory(name=buffers)
+        buffers = np.ndarray((SIMULATION_BUFFERS, 2, len(ids)), dtype=np.float64, buffer=shm.buf)
+    simulator = RunnerSimulator(seed)
+    try:
+        next_tick = time.monotonic()
+        while not stop.is_set():
+            started = time.perf_counter()
+            lats, lons = simulator.step(ids, lats, lons, tick_seconds)
+            try:
+                index = free.get(timeout=tick_seconds)
+            except queue.Empty:
+                index = None  # consumer is behind: drop this tick
+            if index is not None:
+                buffers[index, 0] = lats
+                buffers[index, 1] = lons
+                ready.put((index, (time.perf_counter() - started) * 1000))
+            next_tick += tick_seconds
+            stop.wait(max(0.0, next_tick - time.monotonic()))
+    finally:
+        if shm is not None:
+            del buffers
+            shm.close()
+
+
+class SimulationWorker:
+    """
+    Runs the fleet simulation off the API event loop, in a thread or a process.
+    
+    The worker publishes positions through a small pool of buffers (shared
+    memory for a process) and passes only buffer indexes over queues, so a
+    tick costs one array copy on the API side. The fleet is the store's
+    runners at start().
+    """
+    
+    def __init__(self, store: "RunnerDatabase", mode: str, seed: int = SIMULATION_SEED,
+                 tick_seconds: float = SIMULATION_TICK_SECONDS):
+        self.store = store
+        self.mode = mode
+        self.seed = seed
+        self.tick_seconds = tick_seconds
+        self.ids = np.empty(0, dtype=np.int64)
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._worker: Any = None
+        self._apply_task: Optional[asyncio.Task] = None
+        self.buffers: Optional[np.ndarray] = None
+        self.ticks = 0
+        self.last_tick_ms = 0.0
+        self.total_tick_ms = 0.0
+        self.max_tick_ms = 0.0
+        self.apply_ms = 0.0
+    
+    def start(self):
+        """Snapshot the fleet, start the worker and the apply loop (call from the event loop)"""
+        self.ids, lats, lons = self.store.get_positions()
+        shape = (SIMULATION_BUFFERS, 2, len(self.ids))
+        if self.mode == "process":
+            ctx = multiprocessing.get_context("spawn")
+            self._shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+            self.buffers = np.ndarray(shape, dtype=np.float64, buffer=self._shm.buf)
+            self.free, self.ready, self.stop = ctx.Queue(), ctx.Queue(), ctx.Event()
+            buffer_source: Union[np.ndarray, str] = self._shm.name
+            start_worker = ctx.Process
+        else:
+            self.buffers = np.empty(shape, dtype=np.float64)
+            self.free, self.ready, self.stop = queue.Queue(), queue.Queue(), threading.Event()
+            buffer_source = self.buffers
+            start_worker = threading.Thread
+        for index in range(SIMULATION_BUFFERS):
+            self.free.put(index)
+        self._worker = start_worker(
+            target=simulation_worker,
+            args=(buffer_source, self.ids, lats, lons, self.seed, self.tick_seconds, self.free, self.ready, self.stop),
+            daemon=True,
+            name="runner-simulation"
+        )
+        self._worker.start()
+        self._apply_task = asyncio.create_task(self.apply_loop())
+    
+    async def apply_loop(self):
+        """Apply published position batches to the store, on the event loop"""
+        while not self.stop.is_set():
+            try:
+                index, tick_ms = await asyncio.to_thread(self.ready.get, True, 1.0)
+            except queue.Empty:
+                continue
+            if self.stop.is_set():
+                break
+            started = time.perf_counter()
+            lats = self.buffers[index, 0].copy()
+            lons = self.buffers[index, 1].copy()
+            self.free.put(index)
+            try:
+                self.store.update_positions(self.ids, lats, lons)
+            except Exception as e:
+                logger.error(f"Error applying simulated positions: {str(e)}")
+            self.apply_ms = (time.perf_counter() - started) * 1000
+            self.ticks += 1
+            self.last_tick_ms = tick_ms
+            self.total_tick_ms += tick_ms
+            self.max_tick_ms = max(self.max_tick_ms, tick_ms)
+    
+    async def close(self):
+        """Stop the apply loop and the worker, then release shared memory"""
+        if self._worker is None:
+            return
+        self.stop.set()
+        if self._apply_task is not None:
+            self._apply_task.cancel()
+            try:
+                await self._apply_task
+            except asyncio.CancelledError:
+                pass
+            self._apply_task = None
+        await asyncio.to_thread(self._worker.join, 5)
+        if self._shm is not None:
+            self.buffers = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        self._worker = None
+    
+    def stats(self) -> dict:
+        """Tick counters for the health endpoint"""
+        return {
+            "mode": self.mode,
+            "runners": len(self.ids),
+            "tick_seconds": self.tick_seconds,
+            "ticks": self.ticks,
+            "last_tick_ms": round(self.last_tick_ms, 2),
+            "avg_tick_ms": round(self.total_tick_ms / self.ticks, 2) if self.ticks else 0.0,
+            "max_tick_ms": round(self.max_tick_ms, 2),
+            "last_apply_ms": round(self.apply_ms, 2)
+        }
+
+
+# Recorded GPS trace to replay instead of simulating (CSV, JSONL or packed POSITION_FIX_DTYPE records)
+REPLAY_PATH = os.environ.get("REPLAY_PATH", "")
+# Trace seconds replayed per wall-clock second (1 = real time)
+REPLAY_SPEED = float(os.environ.get("REPLAY_SPEED", "1"))
+# Start over from the beginning of the trace when it ends
+REPLAY_LOOP = os.environ.get("REPLAY_LOOP", "false").lower() in ("1", "true", "yes")
+REPLAY_TICK_SECONDS = float(os.environ.get("REPLAY_TICK_SECONDS", "0.25"))
+# Most fixes ingested per tick, so a replay that falls behind doesn't stall the event loop
+REPLAY_MAX_BATCH = 200000
+
+
+def load_position_trace(path: str) -> np.ndarray:
+    """
+    Load a recorded GPS trace as POSITION_FIX_DTYPE records sorted by timestamp.
+    
+    Binary files (.bin) are memory-mapped, so large traces are paged in as the
+    replay reaches them. CSV rows are runner_id,lat,lon,timestamp with an
+    optional header; JSONL lines are [runner_id, lat, lon, timestamp] or
+    {"runner_id", "lat", "lon", "timestamp"} objects.
+    Raises ValueError on malformed input.
+    """
+    if path.endswith(".bin"):
+        if os.path.getsize(path) % POSITION_FIX_DTYPE.itemsize:
+            raise ValueError(f"File size is not a multiple of {POSITION_FIX_DTYPE.itemsize} bytes")
+        fixes = np.memmap(path, dtype=POSITION_FIX_DTYPE, mode="r") if os.path.getsize(path) \
+            else np.empty(0, dtype=POSITION_FIX_DTYPE)
+    else:
+        if path.endswith(".jsonl"):
+            rows = []
+            with open(path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    fix = json.loads(line)
+                    if isinstance(fix, dict):
+                        fix = [fix["runner_id"], fix["lat"], fix["lon"], fix["timestamp"]]
+                    rows.append(fix)
+            columns = np.asarray(rows, dtype=np.float64).reshape(-1, 4) if rows else np.empty((0, 4))
+        else:
+            with open(path) as f:
+                first = f.readline()
+            try:
+                [float(value) for value in first.split(",")]
+                header = 0
+            except ValueError:
+                header = 1
+            columns = np.loadtxt(path, delimiter=",", skiprows=header, ndmin=2, dtype=np.float64)
+            if columns.size == 0:
+                columns = np.empty((0, 4))
+            elif columns.shape[1] != 4:
+                raise ValueError("Each row must be runner_id,lat,lon,timestamp")
+        fixes = np.empty(len(columns), dtype=POSITION_FIX_DTYPE)
+        fixes["runner_id"] = columns[:, 0]
+        fixes["lat"] = columns[:, 1]
+        fixes["lon"] = columns[:, 2]
+        fixes["timestamp"] = columns[:, 3]
+    timestamps = fixes["timestamp"]
+    if not np.isfinite(timestamps).all():
+        # Fixes without a usable time can't be placed in the replay
+        fixes = fixes[np.isfinite(timestamps)]
+        timestamps = fixes["timestamp"]
+    if len(fixes) > 1 and not np.all(timestamps[1:] >= timestamps[:-1]):
+        # Sorting materializes the trace; write binary traces pre-sorted to keep them mapped
+        fixes = fixes[np.argsort(timestamps, kind="stable")]
+    return fixes
+
+
+class TraceReplayer:
+    """
+    Replays a recorded GPS trace into the runner store at a chosen speed.
+    
+    Every tick the fixes whose trace time has come due are handed to `ingest`
+    (the same batch path as POST /api/runners/positions), with timestamps
+    shifted onto the wall clock. Runners are added the first time the trace
+    mentions them.
+    """
+    
+    def __init__(self, store: "RunnerDatabase", path: str, ingest: Callable[..., dict],
+                 speed: float = REPLAY_SPEED, loop: bool = REPLAY_LOOP,
+                 tick_seconds: float = REPLAY_TICK_SECONDS):
+        if speed <= 0:
+            raise ValueError("Replay speed must be positive")
+        self.store = store
+        self.path = path
+        self.ingest = ingest
+        self.speed = speed
+        self.loop = loop
+        self.tick_seconds = tick_seconds
+        self.fixes = np.empty(0, dtype=POSITION_FIX_DTYPE)
+        self.known: set = set()
+        self.position = 0
+        self.laps = 0
+        self.batches = 0
+        self.replayed = 0
+        self.accepted = 0
+        self.runners_added = 0
+        self.lag_seconds = 0.0
+        self.done = False
+    
+    def _add_new_runners(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray, timestamps: np.ndarray):
+        """Add runners seen for the first time at their first valid position in the batch"""
+        valid = valid_fixes(lats, lons, timestamps)
+        ids, lats, lons = ids[valid], lats[valid], lons[valid]
+        unique_ids, first = np.unique(ids, return_index=True)
+        for runner_id, index in zip(unique_ids.tolist(), first.tolist()):
+            if runner_id in self.known:
+                continue
+            self.known.add(runner_id)
+            if self.store.add_runner(runner_id, f"Runner {runner_id}", float(lats[index]), float(lons[index])):
+                self.runners_added += 1
+    
+    async def run(self):
+        """Load the trace and feed it to the store until it ends (or forever when looping)"""
+        self.fixes = await asyncio.to_thread(load_position_trace, self.path)
+        if len(self.fixes) == 0:
+            self.done = True
+            return
+        timestamps = self.fixes["timestamp"]
+        first_ts = float(timestamps[0])
+        # Trace seconds per lap; one tick of trace time separates the end of a lap from the next start
+        period = float(timestamps[-1]) - first_ts + self.tick_seconds * self.speed
+        wall_start = time.time()
+        mono_start = time.monotonic()
+        while True:
+            trace_now = first_ts + (time.monotonic() - mono_start) * self.speed - self.laps * period
+            due = int(np.searchsorted(timestamps, trace_now, side="right"))
+            end = min(due, self.position + REPLAY_MAX_BATCH)
+            if end > self.position:
+                batch = self.fixes[self.position:end]
+                ids = batch["runner_id"].astype(np.int64)
+                lats = batch["lat"].astype(np.float64)
+                lons = batch["lon"].astype(np.float64)
+                offsets = batch["timestamp"].astype(np.float64) - first_ts + self.laps * period
+                fix_times = wall_start + offsets / self.speed
+                try:
+                    self._add_new_runners(ids, lats, lons, fix_times)
+                    counts = self.ingest(ids, lats, lons, fix_times)
+                    self.accepted += counts["accepted"]
+                except Exception as e:
+                    logger.error(f"Error replaying trace batch: {str(e)}")
+                self.batches += 1
+                self.replayed += end - self.position
+                self.position = end
+            self.lag_seconds = trace_now - float(timestamps[end]) if end < due else 0.0
+            if self.position >= len(self.fixes):
+                if not self.loop:
+                    self.done = True
+                    logger.info(f"Trace replay finished ({self.replayed} fixes)")
+                    return
+                self.laps += 1
+                self.position = 0
+            await asyncio.sleep(self.tick_seconds)
+    
+    def stats(self) -> dict:
+        """Replay progress for the health endpoint"""
+        return {
+            "path": self.path,
+            "speed": self.speed,
+            "loop": self.loop,
+            "fixes": len(self.fixes),
+            "position": self.position,
+            "laps": self.laps,
+            "batches": self.batches,
+            "replayed": self.replayed,
+            "accepted": self.accepted,
+            "runners_added": self.runners_added,
+            "lag_seconds": round(self.lag_seconds, 3),
+            "done": self.done
+        }
+
+
 # ==================== FASTAPI APP SETUP ====================
 
 app = FastAPI(
@@ -410,10 +3332,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize database
-db = RunnerDatabase()
+# Initialize database ("dict" or "numpy" runner store)
+RUNNER_STORE_BACKEND = os.environ.get("RUNNER_STORE_BACKEND", "dict")
+db = ColumnarRunnerDatabase() if RUNNER_STORE_BACKEND == "numpy" else RunnerDatabase()
 order_db = OrderDatabase()
 
+# Per-tick viewport snapshot and cluster cache for /api/runners
+viewport_cache = RunnerViewportCache(db)
+
+# Push channel for live runner positions
+stream_hub = RunnerStreamHub()
+db.add_position_listener(stream_hub.publish)
+
+# Fleet movement simulation (on the event loop, or in a worker thread/process)
+runner_simulator = RunnerSimulator()
+simulation_worker_pool: Optional[SimulationWorker] = (
+    SimulationWorker(db, SIMULATION_MODE) if SIMULATION_MODE in ("thread", "process") else None
+)
+
+# Driving-time ranking for nearest-runner lookups and order assignment
+driving_ranker = DrivingTimeRanker(db, osrm_client)
+
+# Largest number of user points accepted by batch nearest-runner queries
+MAX_BATCH_POINTS = 10000
+
+# Cumulative bulk ingest counters
+ingest_stats = {"batches": 0, "fixes": 0, "seconds": 0.0}
+
+
+def ingest_position_batch(ids: np.ndarray, lats: np.ndarray, lons: np.ndarray, timestamps: np.ndarray) -> dict:
+    """Apply a batch of GPS fixes to the store and count it in the ingest stats"""
+    started = time.perf_counter()
+    counts = db.ingest_positions(ids, lats, lons, timestamps)
+    elapsed = time.perf_counter() - started
+    ingest_stats["batches"] += 1
+    ingest_stats["fixes"] += len(ids)
+    ingest_stats["seconds"] += elapsed
+    return {**counts, "elapsed": elapsed}
+
+
+# Recorded trace replay; takes the place of the simulation when REPLAY_PATH is set
+trace_replayer: Optional[TraceReplayer] = (
+    TraceReplayer(db, REPLAY_PATH, ingest_position_batch) if REPLAY_PATH else None
+)
+
 # Initialize templates
 templates = Jinja2Templates(directory="templates")
 
@@ -422,34 +3384,123 @@ templates = Jinja2Templates(directory="templates")
 
 async def simulate_runner_movement():
     """Background task to simulate runner movement"""
-    import random
-    
     while True:
         try:
-            for runner in db.runners:
-                # Simulate small random movement
-                lat_change = (random.random() - 0.5) * 0.001
-                lon_change = (random.random() - 0.5) * 0.001
-                
-                new_lat = runner["lat"] + lat_change
-                new_lon = runner["lon"] + lon_change
-                
-                db.update_runner_position(runner["id"], new_lat, new_lon)
+            started = time.perf_counter()
+            ids, lats, lons = db.get_positions()
+            new_lats, new_lons = runner_simulator.step(ids, lats, lons, SIMULATION_TICK_SECONDS)
+            db.update_positions(ids, new_lats, new_lons)
+            runner_simulator.record_tick(time.perf_counter() - started)
             
-            logger.info("Runner positions updated")
-            await asyncio.sleep(3)  # Update every 3 seconds
+            logger.debug(f"Runner positions updated ({len(ids)} runners, {runner_simulator.last_tick_ms:.1f} ms)")
+            await asyncio.sleep(SIMULATION_TICK_SECONDS)
             
         except Exception as e:
             logger.error(f"Error in runner simulation: {str(e)}")
-            await asyncio.sleep(3)
+            await asyncio.sleep(SIMULATION_TICK_SECONDS)
+
+
+# Zoom level the stored order routes are simplified for
+ORDER_ROUTE_ZOOM = 15
+# Attempts to get a real route for an order, and the first retry delay (doubled after each attempt)
+ORDER_ROUTE_ATTEMPTS = 4
+ORDER_ROUTE_RETRY_SECONDS = 5.0
+
+background_tasks: set = set()  # strong references so pending tasks aren't garbage collected
+
+
+async def attach_order_route(order: dict, start: Optional[Tuple[float, float]] = None):
+    """
+    Compute the runner -> customer route for an order and store it on the order.
+    Starts from the runner's current position unless start (lat, lon) is given.
+    Straight-line fallbacks are never stored: the request is retried with
+    backoff while the order is active, and the order keeps its previous
+    route (or none) if every attempt fails.
+    """
+    order_id = order["order_id"]
+    delay = ORDER_ROUTE_RETRY_SECONDS
+    for attempt in range(ORDER_ROUTE_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(delay)
+            delay *= 2
+            order = order_db.get_order(order_id)
+            if order is None or order["status"] not in OrderEtaTracker.ACTIVE_STATUSES:
+                return
+            start = None  # the runner has moved on since the first attempt
+        if start is None:
+            runner = db.get_runner(order["nearest_runner_id"])
+            if runner:
+                start = (runner["lat"], runner["lon"])
+            else:
+                start = (order["nearest_runner_lat"], order["nearest_runner_lng"])
+        try:
+            route = await call_osrm_route(start[0], start[1], order["user_lat"], order["user_lng"])
+        except Exception as e:
+            logger.error(f"Order route error ({order_id}): {str(e)}")
+            continue
+        if route.get("estimated"):
+            logger.warning(f"Order route unavailable ({order_id}), attempt {attempt + 1}/{ORDER_ROUTE_ATTEMPTS}")
+            continue
+        view = route_view(route, ORDER_ROUTE_ZOOM)
+        order_db.set_route(order_id, {
+            "distance_km": view["distance_km"],
+            "duration_min": view["duration_min"],
+            "geometry": view["geometry"],
+            "estimated": view["estimated"]
+        })
+        return
+
+
+def schedule_order_route(order: dict, start: Optional[Tuple[float, float]] = None):
+    """Approval listener: route the order in the background"""
+    task = asyncio.create_task(attach_order_route(order, start))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+def schedule_reroute(order: dict, lat: float, lon: float):
+    """ETA tracker callback: re-route an order from the runner's off-route position"""
+    schedule_order_route(order, (lat, lon))
+
+
+order_db.add_approval_listener(schedule_order_route)
+
+# Live ETAs for routed orders, advanced on every runner position batch
+eta_tracker = OrderEtaTracker(order_db, schedule_reroute)
+order_db.add_change_listener(eta_tracker.on_order_change)
+db.add_position_listener(eta_tracker.on_positions)
+
+
+async def load_road_graph(path: str):
+    """Load the offline routing graph without blocking the event loop"""
+    global road_graph
+    try:
+        started = time.perf_counter()
+        road_graph = await asyncio.to_thread(RoadGraph.load, path)
+        logger.info(f"✅ Road graph loaded: {len(road_graph.node_lats)} nodes, {len(road_graph.src)} edges "
+                    f"in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        logger.error(f"❌ Road graph load failed ({path}): {str(e)}")
 
 
 @app.on_event("startup")
 async def startup_event():
     """Start background tasks on app startup"""
     try:
-        asyncio.create_task(simulate_runner_movement())
-        logger.info("✅ Runner simulation started")
+        if SIMULATION_FLEET_SIZE:
+            added = runner_simulator.spawn_fleet(db, SIMULATION_FLEET_SIZE)
+            logger.info(f"✅ Added {added} simulated runners")
+        if trace_replayer is not None:
+            asyncio.create_task(trace_replayer.run())
+            logger.info(f"✅ Trace replay started ({REPLAY_PATH} at {trace_replayer.speed}x)")
+        elif simulation_worker_pool is not None:
+            simulation_worker_pool.start()
+            logger.info(f"✅ Runner simulation started ({SIMULATION_MODE} worker)")
+        elif SIMULATION_MODE != "off":
+            asyncio.create_task(simulate_runner_movement())
+            logger.info("✅ Runner simulation started")
+        if ROUTING_GRAPH_PATH:
+            asyncio.create_task(load_road_graph(ROUTING_GRAPH_PATH))
         logger.info("✅ Server started successfully")
         logger.info("🌐 Admin portal: http://localhost:5000/admin")
         logger.info("🌐 User portal: http://localhost:5000/user")
@@ -457,6 +3508,14 @@ async def startup_event():
         logger.error(f"❌ Startup error: {str(e)}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled connections and stop simulation workers on shutdown"""
+    await osrm_client.close()
+    if simulation_worker_pool is not None:
+        await simulation_worker_pool.close()
+
+
 # ==================== API ROUTES ====================
 
 @app.get("/")
@@ -502,14 +3561,157 @@ async def request_delivery_page(request: Request):
 
 
 
-@app.get("/api/runners", response_model=List[RunnerResponse])
-async def get_all_runners():
+@app.get("/api/runners", response_model=Union[RunnerViewportResponse, List[RunnerResponse]])
+async def get_all_runners(
+    bbox: Optional[str] = Query(None, description="Viewport as west,south,east,north"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom level for clustering")
+):
     """
     ADMIN API: Get all runners
     
-    Returns list of all runners with their current positions and status
+    Returns list of all runners with their current positions and status.
+    With bbox, only runners inside the viewport are returned. With zoom,
+    the response is an object of runners and counted clusters, where dense
+    areas below zoom 16 are collapsed into clusters.
+    """
+    if bbox is None and zoom is None:
+        return db.get_all_runners()
+    
+    try:
+        bounds = parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bbox: {str(e)}")
+    
+    runner_ids, clusters = viewport_cache.query(bounds, zoom)
+    runners = db.get_runners(runner_ids)
+    if zoom is None:
+        return runners
+    return {
+        "zoom": zoom,
+        "version": viewport_cache.version,
+        "runners": runners,
+        "clusters": clusters
+    }
+
+
+@app.post("/api/runners", response_model=RunnerResponse)
+async def create_runner(request: Runner):
+    """
+    ADMIN API: Register a new runner
+    
+    Returns the created runner or 409 if the id is already in use
+    """
+    if not (-90 <= request.latitude <= 90) or not (-180 <= request.longitude <= 180):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    
+    runner = db.add_runner(request.id, request.name, request.latitude, request.longitude, request.status)
+    if not runner:
+        raise HTTPException(status_code=409, detail="Runner id already exists")
+    return runner
+
+
+@app.post("/api/runners/positions", response_model=PositionIngestResponse)
+async def ingest_runner_positions(request: Request):
+    """
+    DEVICE API: Bulk ingest of runner GPS fixes
+    
+    Body is either JSON {"fixes": [[runner_id, lat, lon, timestamp], ...]} or,
+    with Content-Type application/octet-stream, packed little-endian records of
+    int32 runner_id, float64 lat, float64 lon, float64 unix timestamp.
+    The whole batch is applied in one pass.
+    """
+    started = time.perf_counter()
+    body = await request.body()
+    try:
+        ids, lats, lons, timestamps = parse_position_fixes(body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid position batch: {str(e)}")
+    
+    counts = ingest_position_batch(ids, lats, lons, timestamps)
+    counts.pop("elapsed")
+    elapsed = time.perf_counter() - started
+    
+    return {
+        "success": True,
+        "received": len(ids),
+        **counts,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "fixes_per_second": round(len(ids) / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+
+@app.delete("/api/runners/{runner_id}")
+async def delete_runner(runner_id: int):
+    """
+    ADMIN API: Remove a runner by ID
+    """
+    if not db.remove_runner(runner_id):
+        raise HTTPException(status_code=404, detail="Runner not found")
+    return {"success": True, "message": f"Runner {runner_id} removed"}
+
+
+@app.get("/api/runners/stream")
+async def stream_runner_positions(request: Request):
+    """
+    ADMIN API: Live runner positions as Server-Sent Events
+    
+    Sends a "snapshot" event with every runner, then a "positions" event
+    per simulation tick or ingest batch containing only the runners that
+    moved, as {"seq": n, "runners": [[id, lat, lon], ...]}. Clients that
+    fall too far behind are disconnected and should reconnect.
     """
-    return db.get_all_runners()
+    subscriber = stream_hub.subscribe()
+    
+    async def events():
+        try:
+            ids, lats, lons = db.get_positions()
+            snapshot = [list(r) for r in zip(ids.tolist(), lats.tolist(), lons.tolist())]
+            yield stream_hub.encode_frame("snapshot", stream_hub.sequence, snapshot)
+            while not subscriber.dropped:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keepalive\n\n"
+                    continue
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            stream_hub.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/runners/nearby", response_model=NearbyRunnersResponse)
+async def get_nearby_runners(
+    lat: float = Query(..., description="Query latitude"),
+    lng: float = Query(..., description="Query longitude"),
+    k: Optional[int] = Query(None, ge=1, le=1000, description="Number of nearest runners to return"),
+    radius_km: Optional[float] = Query(None, gt=0, description="Only runners within this distance"),
+    status: Optional[str] = Query(None, description="Only runners with this status")
+):
+    """
+    DISPATCH API: Nearest runners around a point
+    
+    Returns the k nearest runners, all runners within radius_km, or the k
+    nearest within radius_km, sorted by distance. Defaults to k=10 when
+    neither is given. Candidates are pruned with the spatial index.
+    """
+    if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    if k is None and radius_km is None:
+        k = 10
+    
+    runners = db.find_runners_nearby(lat, lng, k=k, radius_km=radius_km, status=status)
+    for runner in runners:
+        runner["distance_km"] = round(runner["distance_km"], 3)
+    return {"count": len(runners), "runners": runners}
 
 
 @app.get("/api/runners/{runner_id}", response_model=RunnerResponse)
@@ -525,44 +3727,116 @@ async def get_runner(runner_id: int):
     return runner
 
 
+async def find_nearest_runner_ranked(lat: float, lng: float, ranking: str) -> Tuple[Optional[dict], Optional[float], Optional[float], Optional[float]]:
+    """
+    Nearest runner by straight-line distance or by driving time.
+    Returns (runner_data, distance_km, driving_distance_km, duration_min);
+    distance_km is always the straight-line distance, the driving values are
+    set when driving times were available.
+    """
+    if ranking == "driving":
+        for candidate in await driving_ranker.rank(lat, lng):
+            runner = db.get_runner(candidate["id"])
+            if runner:
+                return runner, candidate["distance_km"], candidate["driving_distance_km"], candidate["duration_min"]
+        return None, None, None, None
+    
+    runner, distance = db.find_nearest_runner(lat, lng)
+    return runner, distance, None, None
+
+
 @app.get("/api/user/nearest-runner", response_model=NearestRunnerResponse)
 async def get_nearest_runner(
     lat: float = Query(..., description="User latitude"),
-    lng: float = Query(..., description="User longitude")
+    lng: float = Query(..., description="User longitude"),
+    ranking: str = Query("haversine", pattern="^(haversine|driving)$",
+                         description="Rank by straight-line distance or by driving time")
 ):
     """
     USER API: Find nearest runner to user location
     
-    Uses Haversine distance formula for accurate calculations.
-    Returns the closest runner and distance in kilometers.
+    With ranking=haversine, returns the closest runner by Haversine distance.
+    With ranking=driving, the nearest runners by Haversine are re-ranked by
+    OSRM driving time (one table request, cached per area for a short time),
+    and the response also includes driving_distance_km and duration_min.
     """
     # Validate coordinates
     if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
         raise HTTPException(status_code=400, detail="Invalid coordinates")
     
-    runner, distance = db.find_nearest_runner(lat, lng)
+    runner, distance, driving_distance, duration = await find_nearest_runner_ranked(lat, lng, ranking)
     
     if not runner:
         raise HTTPException(status_code=404, detail="No runners available")
     
     return {
         "runner": runner,
-        "distance_km": round(distance, 2)
+        "distance_km": round(distance, 2),
+        "driving_distance_km": round(driving_distance, 2) if driving_distance is not None else None,
+        "duration_min": round(duration, 1) if duration is not None else None
+    }
+
+
+@app.post("/api/user/nearest-runners", response_model=NearestRunnersBatchResponse)
+async def get_nearest_runners_batch(request: NearestRunnersBatchRequest):
+    """
+    USER API: Find the nearest runner for many user points in one call
+    
+    Solves the whole points x runners problem in one vectorized pass over a
+    position snapshot, off the event loop. Results are returned in the same
+    order as the points.
+    """
+    if len(request.points) > MAX_BATCH_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_POINTS} points per request")
+    
+    lats = np.fromiter((p.lat for p in request.points), dtype=np.float64, count=len(request.points))
+    lngs = np.fromiter((p.lng for p in request.points), dtype=np.float64, count=len(request.points))
+    if not (np.all(np.abs(lats) <= 90) and np.all(np.abs(lngs) <= 180)):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    
+    # Snapshot on the event loop, solve in a worker thread so other requests keep being served
+    ids, runner_lats, runner_lons = db.get_positions()
+    if len(ids):
+        rows, distances = await asyncio.to_thread(nearest_rows, lats, lngs, runner_lats, runner_lons)
+        matches = db.nearest_matches(ids[rows], distances)
+    else:
+        matches = [(None, None)] * len(lats)
+    
+    return {
+        "results": [
+            {
+                "lat": point.lat,
+                "lng": point.lng,
+                "runner_id": runner["id"] if runner else None,
+                "runner_name": runner["name"] if runner else None,
+                "runner_lat": runner["lat"] if runner else None,
+                "runner_lon": runner["lon"] if runner else None,
+                "distance_km": round(distance, 2) if runner else None
+            }
+            for point, (runner, distance) in zip(request.points, matches)
+        ]
     }
 
 
 @app.get("/api/route", response_model=RouteResponse)
 async def get_route(
+    request: Request,
     start_lat: float = Query(..., description="Start latitude"),
     start_lng: float = Query(..., description="Start longitude"),
     end_lat: float = Query(..., description="End latitude"),
-    end_lng: float = Query(..., description="End longitude")
+    end_lng: float = Query(..., description="End longitude"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Simplify the geometry for this map zoom"),
+    format: str = Query("geojson", pattern="^(geojson|polyline|polyline6)$",
+                        description="Geometry format: GeoJSON or encoded polyline (precision 5 or 6)")
 ):
     """
     ROUTING API: Calculate route between two points
     
-    Calls OSRM backend to compute driving route.
-    Returns route geometry (GeoJSON), distance, and duration.
+    Calls OSRM backend to compute driving route (through the shared route
+    cache and connection pool). Returns route geometry (GeoJSON or an encoded
+    polyline, optionally simplified for a zoom level), distance, and duration.
+    Successful responses carry an ETag; a request whose If-None-Match matches
+    it gets 304 Not Modified with no body.
     """
     # Validate coordinates
     if not ((-90 <= start_lat <= 90) and (-180 <= start_lng <= 180) and
@@ -570,17 +3844,15 @@ async def get_route(
         raise HTTPException(status_code=400, detail="Invalid coordinates")
     
     try:
-        route_data = call_osrm_route(start_lat, start_lng, end_lat, end_lng)
+        route_data = await call_osrm_route(start_lat, start_lng, end_lat, end_lng)
         
         if route_data:
-            return {
-                "success": True,
-                "route": {
-                    "distance_km": round(route_data["distance_km"], 2),
-                    "duration_min": round(route_data["duration_min"], 1),
-                    "geometry": route_data["geometry"]
-                }
-            }
+            view = route_view(route_data, zoom, format)
+            headers = {"ETag": view["etag"], "Cache-Control": "private, no-cache"}
+            if etag_matches(request.headers.get("if-none-match"), view["etag"]):
+                return Response(status_code=304, headers=headers)
+            route = {k: v for k, v in view.items() if k != "etag"}
+            return JSONResponse({"success": True, "route": route}, headers=headers)
         else:
             return {
                 "success": False,
@@ -600,7 +3872,28 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "runners_count": len(db.runners),
+        "runners_count": db.runner_count(),
+        "store_backend": db.backend,
+        "stream": {
+            "subscribers": len(stream_hub.subscribers),
+            "frames_sent": stream_hub.frames_sent,
+            "clients_dropped": stream_hub.clients_dropped
+        },
+        "ingest": {
+            "batches": ingest_stats["batches"],
+            "fixes": ingest_stats["fixes"],
+            "fixes_per_second": round(ingest_stats["fixes"] / ingest_stats["seconds"], 1)
+            if ingest_stats["seconds"] else 0.0
+        },
+        "routing": osrm_client.stats(),
+        "route_cache": route_cache.stats(),
+        "route_view_cache": route_view_cache.stats(),
+        "route_coalescing": route_flights.stats(),
+        "driving_rank": driving_ranker.stats(),
+        "local_routing": road_graph.stats() if road_graph else None,
+        "eta_tracking": eta_tracker.stats(),
+        "simulation": simulation_worker_pool.stats() if simulation_worker_pool else runner_simulator.stats(),
+        "replay": trace_replayer.stats() if trace_replayer else None,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -700,13 +3993,19 @@ async def delete_saved_location(location_name: str):
 
 # ==================== DELIVERY ORDER APIs ====================
 
+def order_response(order: dict) -> OrderResponse:
+    """Build the API response for an order record"""
+    return OrderResponse(**order)
+
+
 @app.post("/api/order/create", response_model=OrderResponse)
 async def create_delivery_order(request: OrderCreateRequest):
     """
     USER API: Create a delivery order request
     
     - Accepts user location (lat/lng)
-    - Finds nearest runner using haversine formula
+    - Finds nearest runner (lowest driving time, or haversine distance
+      when ORDER_RUNNER_RANKING=haversine or OSRM is unavailable)
     - Creates order with status = 'pending'
     - Returns order details
     """
@@ -715,27 +4014,17 @@ async def create_delivery_order(request: OrderCreateRequest):
         raise HTTPException(status_code=400, detail="Invalid coordinates")
     
     # Find nearest runner
-    runner, distance = db.find_nearest_runner(request.user_lat, request.user_lng)
+    runner, distance, driving_distance, duration = await find_nearest_runner_ranked(
+        request.user_lat, request.user_lng, ORDER_RUNNER_RANKING
+    )
     
     if not runner:
         raise HTTPException(status_code=404, detail="No runners available")
     
     # Create order
-    order = order_db.create_order(request.user_lat, request.user_lng, runner, distance)
-    
-    return OrderResponse(
-        order_id=order["order_id"],
-        user_lat=order["user_lat"],
-        user_lng=order["user_lng"],
-        status=order["status"],
-        nearest_runner_id=order["nearest_runner_id"],
-        nearest_runner_name=order["nearest_runner_name"],
-        nearest_runner_lat=order["nearest_runner_lat"],
-        nearest_runner_lng=order["nearest_runner_lng"],
-        distance_km=order["distance_km"],
-        created_time=order["created_time"],
-        updated_time=order["updated_time"]
-    )
+    order = order_db.create_order(request.user_lat, request.user_lng, runner, distance, duration, driving_distance)
+    
+    return order_response(order)
 
 
 @app.get("/api/orders/pending", response_model=List[OrderResponse])
@@ -747,47 +4036,82 @@ async def get_pending_orders():
     """
     pending = order_db.get_pending_orders()
     return [
-        OrderResponse(
-            order_id=o["order_id"],
-            user_lat=o["user_lat"],
-            user_lng=o["user_lng"],
-            status=o["status"],
-            nearest_runner_id=o["nearest_runner_id"],
-            nearest_runner_name=o["nearest_runner_name"],
-            nearest_runner_lat=o["nearest_runner_lat"],
-            nearest_runner_lng=o["nearest_runner_lng"],
-            distance_km=o["distance_km"],
-            created_time=o["created_time"],
-            updated_time=o["updated_time"]
-        )
+        order_response(o)
         for o in pending
     ]
 
 
+@app.get("/api/orders", response_model=OrderPageResponse)
+async def list_orders(
+    status: Optional[str] = Query(None, description="Only orders in this status"),
+    since: Optional[datetime] = Query(None, description="Only orders created at or after this time"),
+    limit: int = Query(50, ge=1, le=1000, description="Page size"),
+    cursor: Optional[int] = Query(None, ge=0, description="next_cursor from the previous page")
+):
+    """
+    ADMIN API: List orders in creation order, optionally by status
+    
+    Pages are keyset-based: pass next_cursor back as cursor to continue.
+    next_cursor is null on the last page.
+    """
+    if status is not None and status not in ORDER_STATUSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown status; expected one of {', '.join(ORDER_STATUSES)}"
+        )
+    orders, next_cursor = order_db.list_orders(
+        status=status,
+        since=since.timestamp() if since else None,  # naive times are server local time
+        limit=limit,
+        cursor=cursor
+    )
+    return OrderPageResponse(
+        orders=[order_response(o) for o in orders],
+        next_cursor=next_cursor
+    )
+
+
+@app.get("/api/orders/changes", response_model=OrderChangesResponse)
+async def get_order_changes(
+    since: int = Query(0, ge=0, description="Cursor returned by the previous call (0 for everything)")
+):
+    """
+    ADMIN API: Get orders created or changed since a cursor
+    
+    Returns each changed order once, in its current state, plus the cursor
+    for the next call. If the cursor has fallen out of the change log,
+    reset is true and the client should reload /api/orders/pending.
+    """
+    orders, cursor, reset = order_db.get_changes(since)
+    return OrderChangesResponse(
+        cursor=cursor,
+        reset=reset,
+        orders=[order_response(o) for o in orders]
+    )
+
+
 @app.get("/api/order/{order_id}", response_model=OrderResponse)
-async def get_order_details(order_id: str):
+async def get_order_details(
+    order_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for a change (long-poll)"),
+    since_version: Optional[int] = Query(None, description="Last order version the client has seen")
+):
     """
     USER/ADMIN API: Get order details by order ID
     
-    Returns full order information including status and runner assignment
+    Returns full order information including status and runner assignment.
+    With wait and since_version, the request is held open until the order's
+    version moves past since_version (or wait seconds pass), so clients can
+    follow status changes without busy polling.
     """
-    order = order_db.get_order(order_id)
+    if wait > 0 and since_version is not None:
+        order = await order_db.wait_for_change(order_id, since_version, wait)
+    else:
+        order = order_db.get_order(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    return OrderResponse(
-        order_id=order["order_id"],
-        user_lat=order["user_lat"],
-        user_lng=order["user_lng"],
-        status=order["status"],
-        nearest_runner_id=order["nearest_runner_id"],
-        nearest_runner_name=order["nearest_runner_name"],
-        nearest_runner_lat=order["nearest_runner_lat"],
-        nearest_runner_lng=order["nearest_runner_lng"],
-        distance_km=order["distance_km"],
-        created_time=order["created_time"],
-        updated_time=order["updated_time"]
-    )
+    return order_response(order)
 
 
 @app.post("/api/order/{order_id}/approve", response_model=OrderResponse)
@@ -797,25 +4121,15 @@ async def approve_delivery_order(order_id: str):
     
     - Changes status from 'pending' to 'approved'
     - Attaches runner details
+    - Starts computing the delivery route in the background; it is stored
+      on the order (bumping its version) once ready
     - Returns updated order
     """
     order = order_db.approve_order(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found or already processed")
     
-    return OrderResponse(
-        order_id=order["order_id"],
-        user_lat=order["user_lat"],
-        user_lng=order["user_lng"],
-        status=order["status"],
-        nearest_runner_id=order["nearest_runner_id"],
-        nearest_runner_name=order["nearest_runner_name"],
-        nearest_runner_lat=order["nearest_runner_lat"],
-        nearest_runner_lng=order["nearest_runner_lng"],
-        distance_km=order["distance_km"],
-        created_time=order["created_time"],
-        updated_time=order["updated_time"]
-    )
+    return order_response(order)
 
 
 @app.post("/api/order/{order_id}/reject", response_model=OrderResponse)
@@ -830,19 +4144,7 @@ async def reject_delivery_order(order_id: str):
     if not order:
         raise HTTPException(status_code=404, detail="Order not found or already processed")
     
-    return OrderResponse(
-        order_id=order["order_id"],
-        user_lat=order["user_lat"],
-        user_lng=order["user_lng"],
-        status=order["status"],
-        nearest_runner_id=order["nearest_runner_id"],
-        nearest_runner_name=order["nearest_runner_name"],
-        nearest_runner_lat=order["nearest_runner_lat"],
-        nearest_runner_lng=order["nearest_runner_lng"],
-        distance_km=order["distance_km"],
-        created_time=order["created_time"],
-        updated_time=order["updated_time"]
-    )
+    return order_response(order)
 
 
 @app.post("/api/order/{order_id}/assign", response_model=OrderResponse)
@@ -857,19 +4159,7 @@ async def assign_delivery_order(order_id: str):
     if not order:
         raise HTTPException(status_code=404, detail="Order not found or not approved")
     
-    return OrderResponse(
-        order_id=order["order_id"],
-        user_lat=order["user_lat"],
-        user_lng=order["user_lng"],
-        status=order["status"],
-        nearest_runner_id=order["nearest_runner_id"],
-        nearest_runner_name=order["nearest_runner_name"],
-        nearest_runner_lat=order["nearest_runner_lat"],
-        nearest_runner_lng=order["nearest_runner_lng"],
-        distance_km=order["distance_km"],
-        created_time=order["created_time"],
-        updated_time=order["updated_time"]
-    )
+    return order_response(order)
 
 
 @app.post("/api/order/{order_id}/complete", response_model=OrderResponse)
@@ -884,19 +4174,7 @@ async def complete_delivery_order(order_id: str):
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    return OrderResponse(
-        order_id=order["order_id"],
-        user_lat=order["user_lat"],
-        user_lng=order["user_lng"],
-        status=order["status"],
-        nearest_runner_id=order["nearest_runner_id"],
-        nearest_runner_name=order["nearest_runner_name"],
-        nearest_runner_lat=order["nearest_runner_lat"],
-        nearest_runner_lng=order["nearest_runner_lng"],
-        distance_km=order["distance_km"],
-        created_time=order["created_time"],
-        updated_time=order["updated_time"]
-    )
+    return order_response(order)
 
 
 # ==================== ERROR HANDLERS ====================
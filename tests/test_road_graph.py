@@ -0,0 +1,46 @@
+"""Tests for building the offline routing graph from OSM XML"""
+import pytest
+
+from app import RoadGraph
+
+OSM_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="13.6280" lon="79.4190"/>
+  <node id="2" lat="13.6290" lon="79.4190"/>
+  <node id="3" lat="13.6300" lon="79.4190"/>
+  <way id="10">
+    <nd ref="1"/>
+    <nd ref="2"/>
+    <nd ref="3"/>
+    {tags}
+  </way>
+</osm>
+"""
+
+
+def build_edges(tmp_path, tags: dict) -> set:
+    """Parse a 3-node way with the given tags; returns {(src_osm_id, dst_osm_id)}"""
+    tag_xml = "\n    ".join(f'<tag k="{k}" v="{v}"/>' for k, v in tags.items())
+    path = tmp_path / "extract.osm"
+    path.write_text(OSM_TEMPLATE.format(tags=tag_xml))
+    graph = RoadGraph.from_osm_xml(str(path))
+    osm_id_by_lat = {13.628: 1, 13.629: 2, 13.63: 3}
+    node_ids = [osm_id_by_lat[round(float(lat), 4)] for lat in graph.node_lats]
+    return {(node_ids[u], node_ids[v]) for u, v in zip(graph.src.tolist(), graph.dst.tolist())}
+
+
+@pytest.mark.parametrize("tags, expected", [
+    ({"highway": "residential"}, {(1, 2), (2, 3), (2, 1), (3, 2)}),
+    ({"highway": "residential", "oneway": "yes"}, {(1, 2), (2, 3)}),
+    ({"highway": "residential", "oneway": "-1"}, {(2, 1), (3, 2)}),
+    ({"highway": "primary", "junction": "roundabout"}, {(1, 2), (2, 3)}),
+    ({"highway": "motorway"}, {(1, 2), (2, 3)}),
+    ({"highway": "motorway", "oneway": "no"}, {(1, 2), (2, 3), (2, 1), (3, 2)}),
+    ({"highway": "motorway", "oneway": "-1"}, {(2, 1), (3, 2)}),
+])
+def test_oneway_directions(tmp_path, tags, expected):
+    assert build_edges(tmp_path, tags) == expected
+
+
+def test_non_drivable_way_is_skipped(tmp_path):
+    assert build_edges(tmp_path, {"highway": "footway"}) == set()